@@ -1,15 +1,28 @@
 from __future__ import annotations
 
 import abc
-from typing import Optional
+from typing import Final, Iterator, Optional
 
 import cv2
 import numpy as np
 from pdf2image import convert_from_path
 
 from File import File
+from Pages import get_runs
 from Type_Alias import Mat, Path, PIL_Img, PIL_Imgs, Save_Result
 
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# renderers of pdf pages
+POPPLER: Final = "poppler"
+PDFIUM: Final = "pdfium"
+# consecutive pages rendered by a pdftoppm subprocess at once when iterating pages.
+# pdf2image runs pdfinfo and pdftoppm for every call, and the pages of a batch are held until they are used.
+POPPLER_BATCH: Final = 8
+
 # from itertools import chain
 # import img2pdf
 
@@ -32,9 +45,25 @@ class IConvertor(metaclass=abc.ABCMeta):
 
 
 class Convertor(IConvertor):
-    def __init__(self) -> None:
+    def __init__(self, pages: Optional[list[int]] = None, dpi: int = 150, renderer: str = POPPLER) -> None:
+        """
+        Args:
+            pages: 0-based indices of pdf pages to render. the default renders all.
+
+            dpi: resolution by which pdf pages are rendered into imgs.
+
+            renderer: POPPLER renders pdf pages by pdftoppm subprocess through pdf2image.
+            PDFIUM renders them in process by pypdfium2, straight into numpy arrays.
+        """
+        if renderer not in (POPPLER, PDFIUM):
+            raise ValueError(f"Invalid renderer {renderer}. It must be {POPPLER} or {PDFIUM}.")
+        if renderer == PDFIUM and pdfium is None:
+            raise ImportError("pdfium renderer requires pypdfium2. Install it to use the renderer.")
         self.__file: Optional[File] = None
         self.__imgs: list[Mat] = []
+        self.__pages: Optional[list[int]] = pages
+        self.__dpi: int = dpi
+        self.__renderer: Final[str] = renderer
 
     @property
     def file(self) -> File:
@@ -43,6 +72,9 @@ class Convertor(IConvertor):
 
     @property
     def imgs(self) -> list[Mat]:
+        """imgs of the file. they are loaded on the first access."""
+        if self.__imgs == []:
+            self.__imgs = self.__load_imgs()
         assert self.__imgs != []
         return self.__imgs
 
@@ -52,17 +84,51 @@ class Convertor(IConvertor):
 
     def read_file(self, file: File) -> None:
         assert file is not None
-        if file.is_img_file():
-            self.__imgs = [cv2.imread(str(p)) for p in file.paths]
-        elif file.is_pdf_file():
-            self.__imgs = self.__pdf_paths_to_cv(file.paths[0])
-        else:
+        if not (file.is_img_file() or file.is_pdf_file()):
             raise Exception("Invalid file. It must be img or pdf.")
         self.__file = file
+        self.__imgs = []
+
+    def __load_imgs(self) -> list[Mat]:
+        if self.file.is_img_file():
+            return [cv2.imread(str(p)) for p in self.file.paths]
+        return self.__pdf_paths_to_cv(self.file.paths[0], dpi=self.__dpi)
 
     def generate_bytes_imgs(self, fmt: str = ".png") -> list[bytes]:
         return [cv2.imencode(fmt, img)[1].tobytes() for img in self.imgs]
 
+    def iter_pdf_pages(self, dpi: Optional[int] = None) -> Iterator[Mat]:
+        """render pdf pages one at a time. unlike imgs, the pages are not kept,
+        so that only the page being used is held however many pages are rendered.
+        poppler renders up to POPPLER_BATCH consecutive pages in a call, which are held until each is used.
+
+        Args:
+            dpi: resolution of the pages. the default uses that of the constructor.
+        """
+        if not self.file.is_pdf_file():
+            raise Exception("File is not pdf.")
+        path: Path = self.file.paths[0]
+        dpi = self.__dpi if dpi is None else dpi
+        if self.__renderer == PDFIUM:
+            yield from self.__pdfium_iter(path, dpi)
+            return
+        indices: list[int] = list(range(self.file.n_pages(path))) if self.__pages is None else self.__pages
+        for first, last in get_runs(indices):
+            for start in range(first, last + 1, POPPLER_BATCH):
+                end: int = min(start + POPPLER_BATCH - 1, last)
+                imgs: PIL_Imgs = convert_from_path(
+                    path, dpi=dpi, grayscale=True, first_page=start + 1, last_page=end + 1
+                )
+                # release each page as soon as it is used
+                imgs.reverse()
+                while imgs:
+                    yield self.__pil2cv(imgs.pop())
+
+    def iter_pdf_pages_byte(self, dpi: Optional[int] = None, fmt: str = ".png") -> Iterator[bytes]:
+        """encode pdf pages one at a time, as each is rendered. see iter_pdf_pages."""
+        for img in self.iter_pdf_pages(dpi):
+            yield cv2.imencode(fmt, img)[1].tobytes()
+
     def __pil2cv(self, pil_img: PIL_Img) -> Mat:
         """PIL -> OpenCV"""
         image_array: Mat = np.array(pil_img, dtype=np.uint8)
@@ -75,12 +141,38 @@ class Convertor(IConvertor):
         return image_array
 
     def __pdf_paths_to_cv(self, path: Path, fmt="png", dpi=150) -> list[Mat]:
+        if self.__renderer == PDFIUM:
+            return self.__pdfium_render(path, dpi)
         # turn a list of lists into a list
         images: PIL_Imgs = self.__pdf_path_to_pil(path, fmt, dpi)
         return [self.__pil2cv(img) for img in images]
 
     def __pdf_path_to_pil(self, path: Path, fmt="png", dpi=150) -> PIL_Imgs:
-        return convert_from_path(path, fmt=fmt, dpi=dpi, grayscale=True)
+        if self.__pages is None:
+            return convert_from_path(path, fmt=fmt, dpi=dpi, grayscale=True)
+        # render only the selected pages, run by run
+        images: PIL_Imgs = []
+        for first, last in get_runs(self.__pages):
+            images += convert_from_path(
+                path, fmt=fmt, dpi=dpi, grayscale=True, first_page=first + 1, last_page=last + 1
+            )
+        return images
+
+    def __pdfium_render(self, path: Path, dpi=150) -> list[Mat]:
+        return list(self.__pdfium_iter(path, dpi))
+
+    def __pdfium_iter(self, path: Path, dpi=150) -> Iterator[Mat]:
+        """render pdf pages in gray. each img is a view of the buffer pdfium renders into, without any copy.
+        the buffer is allocated by python and kept alive by the view."""
+        doc = pdfium.PdfDocument(str(path))
+        try:
+            for i in range(len(doc)) if self.__pages is None else self.__pages:
+                page = doc[i]
+                img: Mat = page.render(scale=dpi / 72, grayscale=True).to_numpy()
+                page.close()
+                yield img
+        finally:
+            doc.close()
 
     # def save_imgs(
     #     self,
@@ -151,10 +243,19 @@ class Convertor(IConvertor):
         if not dir.exists():
             dir.mkdir()
         pdf_path: Path = self.file.paths[0]
-        pages: PIL_Imgs = self.__pdf_path_to_pil(pdf_path, fmt=fmt, dpi=dpi)
-        for i, page in enumerate(pages):
-            file_name: str = f"{pdf_path.stem}_{i}.{fmt}"
-            page.save(str(dir / file_name), "PNG")
+        pages: PIL_Imgs | list[Mat] = (
+            self.__pdfium_render(pdf_path, dpi=dpi)
+            if self.__renderer == PDFIUM
+            else self.__pdf_path_to_pil(pdf_path, fmt=fmt, dpi=dpi)
+        )
+        # name after the original page number, zero-padded so that File.read_dir keeps the page order
+        numbers: list[int] = list(range(len(pages))) if self.__pages is None else self.__pages
+        for i, page in zip(numbers, pages):
+            file_name: str = f"{pdf_path.stem}_{i:04}.{fmt}"
+            if isinstance(page, np.ndarray):
+                cv2.imwrite(str(dir / file_name), page)
+            else:
+                page.save(str(dir / file_name), "PNG")
         f = File()
         f.read_dir(ext=fmt, dir=dir)
         f.set_as_temp()
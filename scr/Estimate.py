@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import zipfile
+from math import ceil
+from os.path import getsize
+from typing import Final, NamedTuple, Optional
+
+from PyPDF2 import PdfReader
+
+from File import File
+from OCR_by_google import OCR, get_img_size
+from Pages import parse_pages
+from Type_Alias import Path
+
+# bytes per pixel of a pdf page rendered in gray and encoded in png.
+# measured on the sample pdfs at 200 dpi, which ranged from 0.002 (blank page) to 0.12 (dense scan).
+PNG_BYTES_PER_PIXEL: Final = 0.07
+
+
+class Estimate(NamedTuple):
+    """what reading a document would cost, estimated without rendering or extracting anything."""
+
+    name: str
+    pages: int
+    requests: int
+    upload_bytes: int
+    # pages which would be rejected for exceeding the api limits
+    rejected: int
+
+
+def get_total(estimates: list[Estimate]) -> Estimate:
+    return Estimate("total", *(sum(e[i] for e in estimates) for i in range(1, len(Estimate._fields))))
+
+
+def get_pdf_page_sizes(path: Path, dpi: int = 200) -> list[tuple[int, int]]:
+    """width and height in pixels of each page of a pdf file rendered at the dpi.
+    only the page tree is read. no page is rendered."""
+    sizes: list[tuple[int, int]] = []
+    for page in PdfReader(str(path)).pages:
+        box = page.cropbox
+        w, h = (round(float(v) * dpi / 72) for v in (box.width, box.height))
+        sizes.append((h, w) if int(page.get("/Rotate", 0)) % 180 else (w, h))
+    return sizes
+
+
+def estimate_file(f: File, pages: Optional[str] = None, dpi: int = 200, tile: bool = False) -> Estimate:
+    """estimate requests and upload bytes of reading a zip, pdf or img files by ocr.
+
+    Args:
+        f: File object of a zip or pdf file, or img files.
+
+        pages: selection of the pages in a zip or pdf file, like '1-5,8'. see Pages.parse_pages for the format.
+        as in ocr, it cannot be given for img files.
+
+        dpi: resolution by which pdf pages are rendered.
+
+        tile: whether imgs over the api limits would be split into tiles. see OCR.
+    """
+    if pages is not None and not (f.is_compressed_file() or f.is_pdf_file()):
+        raise ValueError(f"Pages can be selected only in pdf or zip file. Got {f.ext}.")
+    ocr = OCR(tile=tile)
+    # bytes, and a function giving width and height, of each page
+    if f.is_compressed_file():
+        names: list[str] = f.get_zip_img_names()
+        n_bytes: list[int] = f.get_zip_img_sizes()
+
+        def get_size(i: int) -> tuple[int, int]:
+            with zipfile.ZipFile(str(f.paths[0])) as zf, zf.open(names[i]) as fp:
+                return get_img_size(fp)
+
+    elif f.is_pdf_file():
+        sizes: list[tuple[int, int]] = get_pdf_page_sizes(f.paths[0], dpi=dpi)
+        n_bytes = [ceil(w * h * PNG_BYTES_PER_PIXEL) for w, h in sizes]
+
+        def get_size(i: int) -> tuple[int, int]:
+            return sizes[i]
+
+    else:
+        n_bytes = [getsize(str(p)) for p in f.paths]
+
+        def get_size(i: int) -> tuple[int, int]:
+            return get_img_size(str(f.paths[i]))
+
+    indices: list[int] = list(range(len(n_bytes))) if pages is None else parse_pages(pages, len(n_bytes))
+    requests: int = 0
+    upload_bytes: int = 0
+    rejected: int = 0
+    for i in indices:
+        n: int = ocr.count_requests(n_bytes[i], *(get_size(i) if f.is_pdf_file() else (0, 0)))
+        if n == 0 and n_bytes[i] > 0 and not f.is_pdf_file():
+            # headers of imgs are read only for the few over the byte limit
+            n = ocr.count_requests(n_bytes[i], *get_size(i))
+        requests += n
+        upload_bytes += n_bytes[i] if n > 0 else 0
+        rejected += n == 0
+    name: str = f.paths[0].name if f.is_compressed_file() or f.is_pdf_file() else f.root.resolve().name
+    return Estimate(name, len(indices), requests, upload_bytes, rejected)
+
+
+def estimate_files(
+    file_or_dir: Path,
+    ext: str = "png",
+    pages: Optional[str] = None,
+    dpi: int = 200,
+    tile: bool = False,
+    zips: bool = False,
+) -> list[Estimate]:
+    """estimate each document in a path, as the command reading it would.
+
+    Args:
+        file_or_dir: a zip, pdf or img file, or a directory.
+
+        ext: extension of the img files read in a directory, as ocr reads a directory.
+
+        pages, dpi, tile: see estimate_file.
+
+        zips: whether a directory gives each zip file in it instead, as zocr reads a directory.
+        like zocr, zips in which pages select no page are skipped with the reason printed.
+    """
+    if file_or_dir.is_file():
+        f = File()
+        f.read_file(file_or_dir)
+        return [estimate_file(f, pages=pages, dpi=dpi, tile=tile)]
+    if not zips:
+        imgs = File()
+        imgs.read_dir(ext=ext, dir=file_or_dir)
+        return [] if imgs.is_empty() else [estimate_file(imgs, pages=pages, dpi=dpi, tile=tile)]
+    estimates: list[Estimate] = []
+    for p in sorted(file_or_dir.glob("*.zip")):
+        f = File()
+        f.read_file(p)
+        try:
+            estimates.append(estimate_file(f, pages=pages, dpi=dpi, tile=tile))
+        except ValueError as e:
+            print(f"skip {p.name}: {e}")
+    return estimates
+
+
+def print_estimates(estimates: list[Estimate]) -> None:
+    """print estimates per document and their total."""
+    rows: list[Estimate] = estimates + [get_total(estimates)]
+    width: int = max(len(e.name) for e in rows)
+    print(f"{'document':<{width}} {'pages':>7} {'requests':>9} {'upload MB':>10} {'rejected':>9}")
+    for e in rows:
+        print(f"{e.name:<{width}} {e.pages:>7} {e.requests:>9} {e.upload_bytes / 10**6:>10.2f} {e.rejected:>9}")
@@ -3,7 +3,7 @@ from __future__ import annotations
 import itertools
 import zipfile
 from pprint import pprint
-from typing import Final
+from typing import Final, Optional
 
 from PyPDF2 import PdfFileReader
 
@@ -155,19 +155,56 @@ class File:
             if path not in path_except:
                 path.unlink()
 
-    def get_unzip_file(self, which: int = 0) -> File:
+    def get_zip_img_names(self, which: int = 0) -> list[str]:
+        """names of the img files that get_unzip_file extracts from the zip file, in page order.
+        only the central directory of the zip file is read."""
         if not self.is_compressed_file():
             raise Exception(f"No zip file found. File is {self.ext}.")
-        with zipfile.ZipFile(zip_file := str(self.paths[which])) as zf:
+        with zipfile.ZipFile(str(self.paths[which])) as zf:
+            names: list[str] = [n for n in zf.namelist() if "/" not in n]
+        for ext in self.img_ext:
+            if imgs := sorted(n for n in names if self.__get_ext(Path(n)) == ext):
+                return imgs
+        return []
+
+    def get_zip_img_sizes(self, which: int = 0) -> list[int]:
+        """uncompressed sizes in bytes of the img files in get_zip_img_names, in page order.
+        only the central directory of the zip file is read."""
+        names: list[str] = self.get_zip_img_names(which)
+        with zipfile.ZipFile(str(self.paths[which])) as zf:
+            return [zf.getinfo(n).file_size for n in names]
+
+    def read_zip_img(self, page: int, which: int = 0) -> bytes:
+        """read a single img file in the zip file without extracting it.
+
+        Args:
+            page: 0-based index of the img file in get_zip_img_names.
+
+            which: index of the zip file in self.paths.
+        """
+        name: str = self.get_zip_img_names(which)[page]
+        with zipfile.ZipFile(str(self.paths[which])) as zf:
+            return zf.read(name)
+
+    def get_unzip_file(self, which: int = 0, pages: Optional[list[int]] = None) -> File:
+        """extract img files in the zip file into a new temporary directory.
+
+        Args:
+            which: index of the zip file in self.paths.
+
+            pages: 0-based indices of the img files to extract. the default extracts all.
+        """
+        names: list[str] = self.get_zip_img_names(which)
+        if names == []:
+            raise Exception(f"No img file found in zip {self.paths[which]}")
+        with zipfile.ZipFile(str(self.paths[which])) as zf:
             extract_dir: Path = self.root / "./temp_extract"
-            zf.extractall(str(extract_dir))
-            unzip_file: File = File()
-            for ext in self.img_ext:
-                unzip_file.read_dir(ext=ext, dir=extract_dir)
-                if not unzip_file.is_empty():
-                    unzip_file.set_as_temp()
-                    return unzip_file
-        raise Exception(f"No img file found in zip {zip_file}")
+            for name in names if pages is None else [names[p] for p in pages]:
+                zf.extract(name, str(extract_dir))
+        unzip_file: File = File()
+        unzip_file.read_dir(ext=self.__get_ext(Path(names[0])), dir=extract_dir)
+        unzip_file.set_as_temp()
+        return unzip_file
 
     def on_exit(self, remove_root: bool = False) -> None:
         """remove files in self.paths if self is named temporary.
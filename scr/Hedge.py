@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from queue import SimpleQueue
+from time import perf_counter
+from typing import Callable, Final, NamedTuple, Optional, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+class Hedge_Stats(NamedTuple):
+    # calls made through the hedge, i.e., pages or tiles
+    requests: int
+    # duplicate requests sent
+    hedged: int
+    # duplicate requests that answered first
+    won: int
+
+
+class Hedge:
+    """send a duplicate of a request that takes longer than a running percentile of latency,
+    and take whichever answers first. the slowest pages of a batch dominate its end-to-end latency,
+    and a duplicate often lands on a faster server.
+    a single Hedge is shared by all the requests of a batch so that the latency percentile is learned from them.
+    requests run in daemon threads, so that a losing duplicate still in flight does not keep the process alive at exit.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        max_extra: float = 0.05,
+        min_samples: int = 20,
+        window: int = 1000,
+        max_workers: int = 32,
+    ) -> None:
+        """
+        Args:
+            percentile: percentile of the latencies of recent requests after which a duplicate is sent.
+
+            max_extra: cap of duplicate requests as a ratio to the requests.
+
+            min_samples: no duplicate is sent until this many latencies are observed.
+
+            window: the number of recent latencies the percentile is taken from.
+
+            max_workers: the number of requests, including duplicates, in flight at once.
+        """
+        assert 0 < percentile < 100 and 0 <= max_extra
+        self.__percentile: Final[float] = percentile
+        self.__max_extra: Final[float] = max_extra
+        self.__min_samples: Final[int] = min_samples
+        self.__latencies: deque[float] = deque(maxlen=window)
+        self.__lock: Final = threading.Lock()
+        self.__max_workers: Final[int] = max_workers
+        self.__jobs: Final[SimpleQueue[tuple[Future, Callable, tuple]]] = SimpleQueue()
+        self.__workers: list[threading.Thread] = []
+        self.__requests: int = 0
+        self.__hedged: int = 0
+        self.__won: int = 0
+
+    def get_delay(self) -> Optional[float]:
+        """seconds after which a duplicate is sent. None until enough latencies are observed."""
+        with self.__lock:
+            if len(self.__latencies) < self.__min_samples:
+                return None
+            return float(np.percentile(self.__latencies, self.__percentile))
+
+    def get_stats(self) -> Hedge_Stats:
+        with self.__lock:
+            return Hedge_Stats(self.__requests, self.__hedged, self.__won)
+
+    def print_stats(self) -> None:
+        stats: Hedge_Stats = self.get_stats()
+        delay: Optional[float] = self.get_delay()
+        print(
+            f"{stats.hedged} duplicate requests for {stats.requests} requests, {stats.won} of which answered first."
+            + ("" if delay is None else f" hedging delay: {delay:.2f} s (p{self.__percentile:g}).")
+        )
+
+    def call(self, func: Callable[..., T], *args) -> T:
+        """call func(*args), and call it again concurrently if it takes longer than the delay.
+
+        Return:
+            the result of whichever call succeeds first. if both fail, the error of the first call is raised.
+        """
+        delay: Optional[float] = self.get_delay()
+        with self.__lock:
+            self.__requests += 1
+        first: Future[T] = self.__submit(func, *args)
+        if delay is None or wait([first], timeout=delay).done or not self.__take_budget():
+            return first.result()
+        second: Future[T] = self.__submit(func, *args)
+        pending: set[Future[T]] = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # the first request wins a tie
+            for future in sorted(done, key=lambda f: f is not first):
+                if future.exception() is None:
+                    if future is second:
+                        with self.__lock:
+                            self.__won += 1
+                    return future.result()
+        return first.result()
+
+    def __submit(self, func: Callable[..., T], *args) -> Future[T]:
+        """submit the call, recording its own latency when it succeeds,
+        so that duplicates do not shorten the latencies the percentile is taken from."""
+        start: float = perf_counter()
+        future: Future[T] = Future()
+        self.__jobs.put((future, func, args))
+        with self.__lock:
+            if len(self.__workers) < self.__max_workers:
+                self.__workers.append(threading.Thread(target=self.__work, daemon=True))
+                self.__workers[-1].start()
+
+        def record(f: Future[T]) -> None:
+            if f.exception() is None:
+                with self.__lock:
+                    self.__latencies.append(perf_counter() - start)
+
+        future.add_done_callback(record)
+        return future
+
+    def __work(self) -> None:
+        """run submitted calls until the process exits."""
+        while True:
+            future, func, args = self.__jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def __take_budget(self) -> bool:
+        with self.__lock:
+            if self.__hedged + 1 > self.__max_extra * self.__requests:
+                return False
+            self.__hedged += 1
+            return True
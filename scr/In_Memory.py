@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Final, Iterable, Iterator, NamedTuple, Optional, TypeAlias
+
+import cv2
+import numpy as np
+
+from Hedge import Hedge
+from OCR_by_google import OCR
+from OCR_by_tesseract import Local_OCR
+from Router import LOCAL, Router
+from Symbols import Symbols
+
+# an encoded img like png or jpeg bytes, or a decoded img as an array of shape (height, width[, channels])
+Page_Like: TypeAlias = bytes | bytearray | memoryview | np.ndarray
+# channels of a decoded img: gray, bgr and bgra
+CHANNELS: Final = (1, 3, 4)
+
+
+class Page_Result(NamedTuple):
+    # position of the page in the input
+    index: int
+    # text of each line, with space inserted
+    lines: list[str]
+    # x, y, width and height of each line, of shape (the number of lines, 4)
+    boxes: np.ndarray
+    symbols: Symbols
+
+
+def to_content(page: Page_Like) -> bytes:
+    """encoded img of a page. bytes are returned as they are, without any copy.
+    other buffers are turned into bytes, which the request requires, and decoded imgs are encoded in png.
+    a 1-d array is taken as encoded bytes. ValueError is raised for an array of any other shape than an img."""
+    if isinstance(page, bytes):
+        return page
+    if isinstance(page, np.ndarray) and page.ndim >= 2:
+        if not (page.ndim == 2 or (page.ndim == 3 and page.shape[2] in CHANNELS)):
+            raise ValueError(f"Invalid shape of img {page.shape}. It must be (height, width[, channels]).")
+        return cv2.imencode(".png", page)[1].tobytes()
+    return bytes(page)
+
+
+def is_stack(pages: np.ndarray) -> bool:
+    """whether an array is a stack of decoded imgs along its first axis, of shape (pages, height, width[, channels]).
+    an array of 3 dimensions whose last axis is of gray, bgr or bgra channels is taken as a single img."""
+    return pages.ndim == 4 or (pages.ndim == 3 and pages.shape[2] not in CHANNELS)
+
+
+def ocr_pages(
+    pages: Page_Like | Iterable[Page_Like],
+    engine: str = "vision",
+    lang: str = "eng",
+    tile: bool = False,
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+    workers: int = 4,
+    ordered: bool = True,
+) -> Iterator[Page_Result]:
+    """read pages held in memory, without any file, and yield the result of each page as soon as it is ready.
+
+    Args:
+        pages: a page or pages. an iterable is consumed lazily, only as far as the pages being read.
+        an array is a page of shape (height, width[, channels]), or pages stacked along its first axis. see is_stack.
+        a stack of pages only 1, 3 or 4 pixels wide is read as a single page, which a list of the pages avoids.
+
+        engine: 'vision', 'local' (tesseract) or 'auto' (local for Latin-only pages). see main.read_imgs.
+
+        lang: language of tesseract, used for pages read locally.
+
+        tile, crop, hedge: passed to OCR.
+
+        workers: the number of pages read at once.
+
+        ordered: whether to yield results in the order of the pages.
+        otherwise they are yielded in the order they are ready.
+
+    Return:
+        generator of the result of each page.
+    """
+    if engine not in ("vision", "local", "auto"):
+        raise ValueError(f"Invalid engine {engine}. It must be vision, local or auto.")
+    router: Optional[Router] = Router(lang=lang) if engine == "auto" else None
+
+    def read(index: int, page: Page_Like) -> Page_Result:
+        content: bytes = to_content(page)
+        ocr: OCR
+        if engine == "local" or (router is not None and router.route(content) == LOCAL):
+            ocr = Local_OCR(lang=lang, tile=tile)
+        else:
+            ocr = OCR(tile=tile, crop=crop, hedge=hedge)
+        ocr.read_bytes(content)
+        return Page_Result(index, ocr.get_line_texts(), ocr.get_line_boxes(), ocr.get_symbols())
+
+    single: bool = isinstance(pages, (bytes, bytearray, memoryview)) or (
+        isinstance(pages, np.ndarray) and not is_stack(pages)
+    )
+    indexed: Iterator[tuple[int, Page_Like]] = enumerate([pages] if single else pages)  # type: ignore
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # keep at most workers pages in flight so that the pages are not all held at once
+        in_flight: deque[Future[Page_Result]] = deque()
+        for index, page in indexed:
+            in_flight.append(executor.submit(read, index, page))
+            if len(in_flight) == workers:
+                break
+        while in_flight:
+            if ordered:
+                done: list[Future[Page_Result]] = [in_flight.popleft()]
+            else:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                done = [f for f in in_flight if f in finished]
+                for f in done:
+                    in_flight.remove(f)
+            for future in done:
+                if (next_page := next(indexed, None)) is not None:
+                    in_flight.append(executor.submit(read, *next_page))
+                yield future.result()
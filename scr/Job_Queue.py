@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+import time
+from multiprocessing import Process
+from typing import Final, Optional
+
+import cv2
+
+from Convertor import POPPLER, Convertor
+from File import File
+from main import get_file_obj, get_page_indices, save_text
+from OCR_by_google import OCR
+from Type_Alias import Path
+
+# page states
+PENDING: Final = "pending"
+CLAIMED: Final = "claimed"
+DONE: Final = "done"
+FAILED: Final = "failed"
+
+_schema: Final = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    dir_out TEXT,
+    name_out TEXT,
+    state TEXT NOT NULL DEFAULT 'open',
+    lease_until REAL NOT NULL DEFAULT 0,
+    text_path TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES docs(id),
+    seq INTEGER NOT NULL,
+    src TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    text TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS pages_state ON pages(state, lease_until);
+CREATE INDEX IF NOT EXISTS pages_doc ON pages(doc_id, seq);
+"""
+
+# text put in place of a page which has failed
+_failed_page: Final = "[ocr failed: page {}]"
+
+
+class Job_Queue:
+    """page-level work queue of ocr stored in a local sqlite file.
+
+    any number of worker processes can claim pages from the same file.
+    a claim is a lease that expires after lease seconds,
+    so pages claimed by a crashed worker are claimed again by another worker.
+    the text of a document is saved when the last page of it is done or failed.
+    assembling a document is leased in the same way.
+    failed pages are marked in the text, and listed by get_failed_pages.
+    hosts may share the queue file on a filesystem only if it supports sqlite's file locking.
+    """
+
+    def __init__(self, db: Path | str, lease: float = 300, max_attempts: int = 3, worker: Optional[str] = None) -> None:
+        """
+        Args:
+            db: path of the sqlite file. it is created if not exists.
+
+            lease: seconds for which a claimed page is kept from the other workers.
+
+            max_attempts: the number of times a page is tried before it is marked as failed.
+
+            worker: name of this worker. the default uses the host name and the process id.
+        """
+        self.__db: Path = Path(db)
+        self.__lease: Final[float] = lease
+        self.__max_attempts: Final[int] = max_attempts
+        self.__worker: str = f"{socket.gethostname()}:{os.getpid()}" if worker is None else worker
+        # autocommit mode. transactions are begun explicitly
+        self.__con = sqlite3.connect(str(self.__db), timeout=60, isolation_level=None)
+        self.__con.executescript(_schema)
+        # queues created before assembling was leased
+        if "lease_until" not in [row[1] for row in self.__con.execute("PRAGMA table_info(docs)")]:
+            self.__con.execute("ALTER TABLE docs ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+
+    @property
+    def db(self) -> Path:
+        return self.__db
+
+    @property
+    def worker(self) -> str:
+        return self.__worker
+
+    def close(self) -> None:
+        self.__con.close()
+
+    def enqueue(
+        self,
+        file_or_dir: Path | str,
+        ext: str = "png",
+        dir_out: Optional[Path] = None,
+        name_out: Optional[str] = None,
+        pages: Optional[str] = None,
+    ) -> int:
+        """plan the pages of a document and add them to the queue. nothing is rendered or extracted here.
+        arguments are the same as those of main.ocr_by_cloud_vision_api.
+
+        Return:
+            the number of the added pages.
+        """
+        f, _ = get_file_obj(file_or_dir, ext, expand=False)
+        indices: Optional[list[int]] = get_page_indices(f, pages)
+        if f.is_compressed_file() or f.is_pdf_file():
+            n_pages: int = f.n_pages(f.paths[0]) if f.is_pdf_file() else len(f.get_zip_img_names())
+            planned: list[tuple[Path, int]] = [
+                (f.paths[0], i) for i in (range(n_pages) if indices is None else indices)
+            ]
+        else:
+            planned = [(p, 0) for p in f.paths]
+        self.__con.execute("BEGIN IMMEDIATE")
+        try:
+            cur = self.__con.execute(
+                "INSERT INTO docs (path, ext, dir_out, name_out) VALUES (?, ?, ?, ?)",
+                (str(Path(file_or_dir).resolve()), ext, None if dir_out is None else str(dir_out.resolve()), name_out),
+            )
+            self.__con.executemany(
+                "INSERT INTO pages (doc_id, seq, src, page) VALUES (?, ?, ?, ?)",
+                [(cur.lastrowid, seq, str(src.resolve()), page) for seq, (src, page) in enumerate(planned)],
+            )
+            self.__con.execute("COMMIT")
+        except BaseException:
+            self.__con.execute("ROLLBACK")
+            raise
+        return len(planned)
+
+    def claim(self) -> Optional[tuple[int, Path, int]]:
+        """claim a pending page or a page whose lease has expired.
+
+        Return:
+            id of the page, path of its source file and 0-based page index in the file.
+            None if no page can be claimed now.
+        """
+        now: float = time.time()
+        self.__con.execute("BEGIN IMMEDIATE")
+        try:
+            # give up pages whose workers have crashed too many times
+            self.__con.execute(
+                "UPDATE pages SET state = ?, error = 'lease expired' "
+                + "WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, CLAIMED, now, self.__max_attempts),
+            )
+            row = self.__con.execute(
+                "SELECT id, src, page FROM pages WHERE state = ? OR (state = ? AND lease_until < ?) "
+                + "ORDER BY doc_id, seq LIMIT 1",
+                (PENDING, CLAIMED, now),
+            ).fetchone()
+            if row is not None:
+                self.__con.execute(
+                    "UPDATE pages SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (CLAIMED, self.worker, now + self.__lease, row[0]),
+                )
+            self.__con.execute("COMMIT")
+        except BaseException:
+            self.__con.execute("ROLLBACK")
+            raise
+        return None if row is None else (row[0], Path(row[1]), row[2])
+
+    def complete(self, page_id: int, text: str) -> Optional[Path]:
+        """store the text of a claimed page.
+        the text of the document is saved if this is the last page of it.
+
+        Return:
+            path of the saved text file if saved, otherwise None.
+        """
+        cur = self.__con.execute(
+            "UPDATE pages SET state = ?, text = ?, error = NULL WHERE id = ? AND state = ? AND worker = ?",
+            (DONE, text, page_id, CLAIMED, self.worker),
+        )
+        # the lease has expired and the page has been claimed by another worker
+        if cur.rowcount != 1:
+            return None
+        (doc_id,) = self.__con.execute("SELECT doc_id FROM pages WHERE id = ?", (page_id,)).fetchone()
+        return self.__assemble(doc_id) if self.__claim_doc(doc_id) else None
+
+    def __claim_doc(self, doc_id: int) -> bool:
+        """claim a document to assemble if all of its pages are done or failed,
+        or if the worker assembling it has not finished within the lease.
+        only one worker succeeds for each document at a time.
+        assembling again is harmless since it only saves the same text again."""
+        now: float = time.time()
+        cur = self.__con.execute(
+            "UPDATE docs SET state = 'assembling', lease_until = ? "
+            + "WHERE id = ? AND (state = 'open' OR (state = 'assembling' AND lease_until < ?)) "
+            + "AND NOT EXISTS (SELECT 1 FROM pages WHERE doc_id = ? AND state NOT IN (?, ?))",
+            (now + self.__lease, doc_id, now, doc_id, DONE, FAILED),
+        )
+        return cur.rowcount == 1
+
+    def assemble_ready(self) -> list[Path]:
+        """save the text of every document whose pages are all done or failed but not saved yet,
+        e.g., because the worker that did the last page crashed before or while saving it."""
+        doc_ids: list[int] = [
+            i for (i,) in self.__con.execute("SELECT id FROM docs WHERE state IN ('open', 'assembling')")
+        ]
+        return [self.__assemble(i) for i in doc_ids if self.__claim_doc(i)]
+
+    def fail(self, page_id: int, error: str) -> None:
+        """release a claimed page after an error so that it is tried again,
+        or mark it as failed if it has been tried max_attempts times."""
+        self.__con.execute(
+            "UPDATE pages SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, lease_until = 0, error = ? "
+            + "WHERE id = ? AND state = ? AND worker = ?",
+            (self.__max_attempts, PENDING, FAILED, error, page_id, CLAIMED, self.worker),
+        )
+        (doc_id,) = self.__con.execute("SELECT doc_id FROM pages WHERE id = ?", (page_id,)).fetchone()
+        # this might be the last page of the document
+        if self.__claim_doc(doc_id):
+            self.__assemble(doc_id)
+
+    def __assemble(self, doc_id: int) -> Path:
+        path, ext, dir_out, name_out = self.__con.execute(
+            "SELECT path, ext, dir_out, name_out FROM docs WHERE id = ?", (doc_id,)
+        ).fetchone()
+        texts: list[str] = [
+            _failed_page.format(seq + 1) if state == FAILED else t
+            for seq, state, t in self.__con.execute(
+                "SELECT seq, state, text FROM pages WHERE doc_id = ? ORDER BY seq", (doc_id,)
+            )
+        ]
+        try:
+            f, _ = get_file_obj(path, ext, expand=False)
+            text_path, success = save_text(
+                text="\n".join(texts), file=f, dir_out=None if dir_out is None else Path(dir_out), name_out=name_out
+            )
+            if not success:
+                msg = f"Error occurred while trying to save ocr text {text_path}"
+                raise Exception(msg)
+        except BaseException:
+            # let the document be assembled again
+            self.__con.execute("UPDATE docs SET state = 'open' WHERE id = ?", (doc_id,))
+            raise
+        self.__con.execute("UPDATE docs SET state = ?, text_path = ? WHERE id = ?", (DONE, str(text_path), doc_id))
+        return text_path
+
+    def is_finished(self) -> bool:
+        """whether no page is left to be done, i.e., every page is either done or failed."""
+        row = self.__con.execute("SELECT COUNT(*) FROM pages WHERE state IN (?, ?)", (PENDING, CLAIMED)).fetchone()
+        return row[0] == 0
+
+    def get_failed_pages(self) -> list[tuple[Path, int, str]]:
+        """path of the document, 1-based page number in it and the last error of each failed page."""
+        return [
+            (Path(path), seq + 1, error)
+            for path, seq, error in self.__con.execute(
+                "SELECT docs.path, pages.seq, pages.error FROM pages JOIN docs ON docs.id = pages.doc_id "
+                + "WHERE pages.state = ? ORDER BY pages.doc_id, pages.seq",
+                (FAILED,),
+            )
+        ]
+
+    def print_failed_pages(self) -> None:
+        failed: list[tuple[Path, int, str]] = self.get_failed_pages()
+        if failed == []:
+            return
+        print(f"{len(failed)} pages failed. their text is replaced with '{_failed_page.format('n')}'.")
+        for path, page, error in failed:
+            print(f"  {path} page {page}: {error}")
+
+    def get_status(self) -> dict[str, int]:
+        """the number of pages in each state."""
+        counts: dict[str, int] = {state: 0 for state in (PENDING, CLAIMED, DONE, FAILED)}
+        for state, n in self.__con.execute("SELECT state, COUNT(*) FROM pages GROUP BY state"):
+            counts[state] = n
+        return counts
+
+
+def get_page_bytes(src: Path, page: int, dpi: int = 200, renderer: str = POPPLER) -> bytes:
+    """encoded img of a single page of a pdf, zip or img file. renderer is passed to Convertor."""
+    f = File()
+    f.read_file(src)
+    if f.is_compressed_file():
+        return f.read_zip_img(page)
+    if f.is_pdf_file():
+        c = Convertor(pages=[page], dpi=dpi, renderer=renderer)
+        c.read_file(f)
+        return cv2.imencode(".png", c.imgs[0])[1].tobytes()
+    return src.read_bytes()
+
+
+def work(db: Path | str, lease: float = 300, poll: float = 1.0, renderer: str = POPPLER) -> int:
+    """claim and ocr pages in the queue until every page is done or failed.
+
+    Args:
+        db: path of the sqlite file of the queue.
+
+        lease: seconds for which a claimed page is kept from the other workers.
+
+        poll: seconds to wait when all the remaining pages are claimed by the other workers.
+
+        renderer: renderer of pdf pages. see Convertor.
+
+    Return:
+        the number of pages this worker has done.
+    """
+    queue = Job_Queue(db, lease=lease)
+    n_done: int = 0
+    try:
+        while True:
+            claimed = queue.claim()
+            if claimed is None:
+                if queue.is_finished():
+                    queue.assemble_ready()
+                    return n_done
+                # pages claimed by the others might be released after their leases expire
+                time.sleep(poll)
+                continue
+            page_id, src, page = claimed
+            try:
+                ocr = OCR()
+                ocr.read_bytes(get_page_bytes(src, page, renderer=renderer))
+                text: str = ocr.get_text()
+            except Exception as e:
+                queue.fail(page_id, repr(e))
+                continue
+            queue.complete(page_id, text)
+            n_done += 1
+    finally:
+        queue.close()
+
+
+def work_in_processes(db: Path | str, workers: int = 1, lease: float = 300, renderer: str = POPPLER) -> None:
+    """run workers in local processes and wait for all of them."""
+    processes: list[Process] = [
+        Process(target=work, args=(db, lease), kwargs=dict(renderer=renderer)) for _ in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    queue = Job_Queue(db)
+    try:
+        queue.print_failed_pages()
+    finally:
+        queue.close()
@@ -1,23 +1,57 @@
 from __future__ import annotations
 
 import abc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from itertools import chain
 from math import floor
 from os.path import getsize
-from typing import Final, TypeGuard
+from typing import IO, Final, Optional, TypeGuard
 
+import cv2
 import numpy as np
 from google.cloud import vision
 from google.cloud.vision_v1.types.image_annotator import AnnotateImageResponse as Response
+from PIL import Image, UnidentifiedImageError
 
+from Hedge import Hedge
 from Rect import Rect
-from Type_Alias import Contour, Path, Point_dtype
+from Symbols import Symbols
+from Text_Region import crop_to_text_region
+from Tiles import Tile, get_tiles
+from Type_Alias import Contour, Mat, Path, Point_dtype
 
 # from google.cloud.vision_v1.types.text_annotation import Symbol
 # from google.cloud.vision_v1.types.text_annotation import TextAnnotation
 # from google.cloud.vision_v1.types.geometry import BoundingPoly
 
 
+def get_img_size(content: bytes | IO[bytes] | str) -> tuple[int, int]:
+    """width and height of an img read from its header only. (0, 0) if the header is unknown.
+    content is an encoded img, a file object of it, e.g., a member of a zip file, or its path.
+    pil raises DecompressionBombError for an img of more than twice its own limit of pixels."""
+    try:
+        with Image.open(BytesIO(content) if isinstance(content, bytes) else content) as img:
+            return img.size
+    except (UnidentifiedImageError, OSError):
+        return 0, 0
+
+
+def decode_img(content: bytes) -> Mat:
+    """decode an encoded img, in bgr like opencv if colored.
+    pil is used for formats opencv cannot decode, such as gif."""
+    img: Optional[Mat] = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if img is not None:
+        return img
+    try:
+        with Image.open(BytesIO(content)) as pil_img:
+            if pil_img.mode in ("1", "L", "P"):
+                return np.array(pil_img.convert("L"))
+            return cv2.cvtColor(np.array(pil_img.convert("RGB")), cv2.COLOR_RGB2BGR)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Failed to decode img of {len(content)/(10**6)} MB.") from e
+
+
 class Box(Rect):
     def __init__(self, text: str, rect: Rect):
         self.text: str = text
@@ -37,11 +71,50 @@ class IOCR(metaclass=abc.ABCMeta):
 
 
 class OCR(IOCR):
-    def __init__(self):
+    def __init__(
+        self,
+        vertical_scale: float = 0.7,
+        iqr_scale: float = 1.5,
+        height_scale: float = 0.8,
+        tile: bool = False,
+        tile_size: int = 4000,
+        tile_overlap: int = 256,
+        crop: bool = False,
+        hedge: Optional[Hedge] = None,
+    ):
+        """
+        Args:
+            vertical_scale: scale for the threshold by which symbols are grouped into lines.
+
+            iqr_scale, height_scale: scales for the thresholds by which spaces are inserted in lines.
+
+            tile: whether to split an img too large for the api into overlapping tiles
+            and read them concurrently, instead of rejecting it.
+
+            tile_size: side length of a tile in pixels. tiles are made smaller if still too large.
+
+            tile_overlap: overlap of adjacent tiles in pixels. it must be larger than any symbol in the img.
+
+            crop: whether to crop an img to its text region before uploading it.
+            symbols are shifted back to the coordinates of the whole img,
+            while the response stays in those of the cropped img.
+
+            hedge: if provided, a request slower than its latency percentile is sent again. see Hedge.
+        """
         self._empty_response: Final = Response()
         self._max_img_size: Final[int] = 20 * 10**6
+        self._max_img_pixels: Final[int] = 75 * 10**6
+        self._tile: Final[bool] = tile
+        self._tile_size: Final[int] = tile_size
+        self._tile_overlap: Final[int] = tile_overlap
+        self._crop: Final[bool] = crop
+        self._hedge: Final[Optional[Hedge]] = hedge
+        self._vertical_scale: Final[float] = vertical_scale
+        self._iqr_scale: Final[float] = iqr_scale
+        self._height_scale: Final[float] = height_scale
         # dummy response to mean there is no valid response
         self._response: Response = self._empty_response
+        self._symbols: Optional[Symbols] = None
         self._lines: list[list[Box]] = []
 
     @property
@@ -51,21 +124,104 @@ class OCR(IOCR):
     def get_lines(self) -> list[list[Box]]:
         return self._lines
 
+    def get_symbols(self) -> Symbols:
+        """symbols recognized in the response, or those set by read_symbols."""
+        if self._symbols is None:
+            self._symbols = Symbols.from_response(self.response)
+        return self._symbols
+
     def is_response_set(self) -> TypeGuard[Response]:
-        return self.response != self._empty_response
+        return self.response != self._empty_response or self._symbols is not None
 
     def read_img(self, img_path: Path) -> None:
         """set response property by reading image file."""
-        if not self.check_size(img_path):
+        if not self.check_size(img_path) and not (self._tile and getsize(str(img_path)) > 0):
             msg: str = f"Invalid img size. Got {getsize(str(img_path))/(10**6)} MB. It must be under {self._max_img_size//(10**6)} MB."
             raise ValueError(msg)
+        self.read_bytes(self.get_byte_img(img_path))
+
+    def read_bytes(self, content: bytes) -> None:
+        """set response property by reading encoded image, e.g., png or jpeg bytes."""
+        if not (self._crop and len(content) > 0):
+            self.__read_bytes(content)
+            return
+        cropped, (dx, dy) = crop_to_text_region(content)
+        self.__read_bytes(cropped)
+        if (dx, dy) != (0, 0):
+            self._symbols = self.get_symbols().shift(dx, dy)
+
+    def __read_bytes(self, content: bytes) -> None:
+        if self._tile and len(content) > 0 and self.__is_over_limits(content):
+            self.read_tiles(decode_img(content))
+            return
+        if not 0 < len(content) < self._max_img_size:
+            msg: str = (
+                f"Invalid img size. Got {len(content)/(10**6)} MB. It must be under {self._max_img_size//(10**6)} MB."
+            )
+            raise ValueError(msg)
+        self._response = self.__request(content) if self._hedge is None else self._hedge.call(self.__request, content)
+        # clear old symbols and lines
+        self._symbols = None
+        self._lines = []
+
+    def __is_over_limits(self, content: bytes) -> bool:
+        """whether an encoded img is over the limits of the api. the img is not decoded."""
+        if len(content) >= self._max_img_size:
+            return True
+        try:
+            width, height = get_img_size(content)
+        except Image.DecompressionBombError:
+            # pil's limit is larger than that of the api
+            return True
+        return width * height > self._max_img_pixels
+
+    def __request(self, content: bytes) -> Response:
+        """a request to the api. an error set in the response, e.g., of a bad img, quota or an internal error,
+        is raised instead of being taken for a blank page."""
+        res: Response = self._annotate(content)
+        if res.error.message:
+            raise Exception(f"Vision API returned error {res.error.code}: {res.error.message}")
+        return res
+
+    def _annotate(self, content: bytes) -> Response:
+        """a single request to the api."""
         client = vision.ImageAnnotatorClient()
-        self._response = client.document_text_detection(  # type: ignore
-            image=vision.Image(content=self.get_byte_img(img_path)),
+        return client.document_text_detection(  # type: ignore
+            image=vision.Image(content=content),
             image_context={"language_hints": ["ja", "eng"]},
         )
-        # clear old lines
-        self._lines = []
+
+    def read_tiles(self, img: Mat) -> None:
+        """set symbols by reading overlapping tiles of the img concurrently.
+        each symbol is taken only from the tile whose core contains the center of the symbol,
+        which removes duplicates in the overlaps. the symbols are laid out as if the img was read whole.
+        """
+        tiles, contents = self.__encode_tiles(img, self._tile_size)
+
+        def read_tile(tile: Tile, content: bytes) -> Symbols:
+            ocr = type(self)(tile=False, hedge=self._hedge)
+            ocr.read_bytes(content)
+            symbols: Symbols = ocr.get_symbols().shift(tile.x, tile.y)
+            cx: np.ndarray = symbols.x + symbols.w // 2
+            cy: np.ndarray = symbols.y + symbols.h // 2
+            (x0, x1), (y0, y1) = tile.core_x, tile.core_y
+            return symbols.select((x0 <= cx) & (cx < x1) & (y0 <= cy) & (cy < y1))
+
+        with ThreadPoolExecutor(max_workers=min(8, len(tiles))) as executor:
+            self.read_symbols(Symbols.concat(list(executor.map(read_tile, tiles, contents))))
+
+    def __encode_tiles(self, img: Mat, size: int) -> tuple[list[Tile], list[bytes]]:
+        """split the img into tiles of the size, made smaller until every encoded tile is within the limits."""
+        size = min(size, int(self._max_img_pixels**0.5))
+        tiles: list[Tile] = get_tiles(img.shape[1], img.shape[0], size, self._tile_overlap)
+        contents: list[bytes] = [
+            cv2.imencode(".png", img[t.y : t.y + t.height, t.x : t.x + t.width])[1].tobytes() for t in tiles
+        ]
+        if any(len(c) >= self._max_img_size for c in contents):
+            if size // 2 <= 2 * self._tile_overlap:
+                raise ValueError(f"Failed to split img into tiles under {self._max_img_size//(10**6)} MB.")
+            return self.__encode_tiles(img, size // 2)
+        return tiles, contents
 
     def get_byte_img(self, img_path: Path) -> bytes:
         with open(str(img_path), mode="rb") as img:
@@ -74,93 +230,212 @@ class OCR(IOCR):
     def check_size(self, img_path: Path) -> bool:
         return 0 < getsize(str(img_path)) < self._max_img_size
 
+    def count_requests(self, n_bytes: int, width: int = 0, height: int = 0) -> int:
+        """the number of requests read_bytes would make for an encoded img, without reading it.
+        0 if the img would be rejected. tiles are made smaller as in read_tiles,
+        supposing the bytes of a tile are proportional to its area.
+
+        Args:
+            n_bytes: size of the encoded img.
+
+            width, height: size of the img in pixels. 0 if unknown, when only n_bytes is checked.
+        """
+        if n_bytes <= 0:
+            return 0
+        if n_bytes < self._max_img_size and width * height <= self._max_img_pixels:
+            return 1
+        if not self._tile or width * height == 0:
+            return 0
+        size: int = min(self._tile_size, int(self._max_img_pixels**0.5))
+        while n_bytes * min(size, width) * min(size, height) >= self._max_img_size * width * height:
+            if size // 2 <= 2 * self._tile_overlap:
+                return 0
+            size //= 2
+        return len(get_tiles(width, height, size, self._tile_overlap))
+
     def read_response(self, res: Response) -> None:
         """directly set response property without reading image file."""
         self._response = res
+        # clear old symbols and lines
+        self._symbols = None
+        self._lines = []
+
+    def read_symbols(self, symbols: Symbols) -> None:
+        """directly set symbols without any response, e.g., those saved by a former run."""
+        self._response = self._empty_response
+        self._symbols = symbols
         # clear old lines
         self._lines = []
 
-    def _get_vertical_threshold(self, boxes: list[Box], scale: float = 0.7) -> int:
+    def _get_vertical_threshold(self, h: np.ndarray, scale: float = 0.7) -> int:
         """used for classifying bounding boxes"""
-        assert boxes != []
-        h_array = np.array([b.height for b in boxes])
-        return floor(np.median(h_array) * scale)
+        assert len(h) > 0
+        return floor(np.median(h) * scale)
 
-    def _get_horizontal_threshold_iqr(self, line: list[Box], scale: float = 1.5) -> int:
+    def _get_horizontal_threshold_iqr(self, x: np.ndarray, w: np.ndarray, scale: float = 1.5) -> int:
         """threshold for each line by which we decide whether to insert a space character between characters in that line.
         this thr is determined by the iqr of x-interval of boxes in the line.
         """
-        x_interval: list[int] = [box.x - (line[i - 1].x + line[i - 1].width) for i, box in enumerate(line) if 0 < i]
-        # this list might be empty. in that case an arbitrary is returned
-        if x_interval == []:
+        x_interval: np.ndarray = x[1:] - (x[:-1] + w[:-1])
+        # this array might be empty. in that case an arbitrary is returned
+        if len(x_interval) == 0:
             return self._max_img_size
         q3, q1 = np.percentile(x_interval, [75, 25])
         iqr = q3 - q1
         return floor(q3 + scale * iqr)
 
-    def _get_horizontal_threshold_height_base(self, line: list[Box], scale: float = 0.8) -> int:
+    def _get_horizontal_threshold_height_base(self, y: np.ndarray, h: np.ndarray, scale: float = 0.8) -> int:
         """threshold for each line by which we decide whether to insert a space character between characters in that line.
         this threshold is determined relative to the heigh of rect accommodating the entire line.
         """
         # calculate the height of accommodating rect of the line
-        y_max: int = 0
-        y_min: int = self._max_img_size
-        for box in line:
-            y_min = min(y_min, box.y)
-            y_max = max(y_max, box.y + box.height)
+        y_max: int = max(0, int((y + h).max()))
+        y_min: int = min(self._max_img_size, int(y.min()))
         return floor(scale * abs(y_max - y_min))
 
-    def _get_horizontal_threshold(self, line: list[Box]) -> int:
-        return min(self._get_horizontal_threshold_iqr(line), self._get_horizontal_threshold_height_base(line))
+    def _get_horizontal_threshold(self, x: np.ndarray, y: np.ndarray, w: np.ndarray, h: np.ndarray) -> int:
+        return min(
+            self._get_horizontal_threshold_iqr(x, w, scale=self._iqr_scale),
+            self._get_horizontal_threshold_height_base(y, h, scale=self._height_scale),
+        )
 
-    def _set_sorted_lines(self):
-        """set self.lines property.
-        self.lines is an empty list until this method is called.
-        elements in each line in self.lines corresponds to
-        those in the each line in the img.
+    def _get_sorted_line_indices(self) -> list[np.ndarray]:
+        """group symbols by row and return indices of the symbols in each row.
+        the rows are sorted from top to bottom,
+        and indices in each row are sorted so that symbols are left-to-right.
         """
         assert self.is_response_set()
-        # store recognized elements
-        boxes: list[Box] = []
-        pages = self.response.full_text_annotation.pages
-        assert len(pages) > 0
-        for page in pages:
-            for block in page.blocks:
-                for paragraph in block.paragraphs:
-                    for word in paragraph.words:
-                        for symbol in word.symbols:
-                            ver = symbol.bounding_box.vertices
-                            x: int = ver[0].x
-                            y: int = ver[0].y
-                            w: int = ver[1].x - x
-                            h: int = ver[3].y - y
-                            text = symbol.text
-                            p: tuple[int, int] = (max(0, x), max(0, y))
-                            rect = Rect((p, w, h))
-                            box = Box(text, rect)
-                            boxes.append(box)
-        # At this point, boxes are not necessarily sorted in a reasonable order.
-        # Group boxes by row. the rows are sorted from top to bottom.
-        # elements in each grouped row should then be sorted left-to-right.
-        boxes.sort(key=lambda box: box.y)
-        line: list[Box] = []
-        lines: list[list[Box]] = []
-        threshold: int = self._get_vertical_threshold(boxes=boxes)
+        symbols: Symbols = self.get_symbols()
+        assert not symbols.is_empty()
+        x, y, _, h = symbols.get_columns()
+        # At this point, symbols are not necessarily sorted in a reasonable order.
+        order: np.ndarray = np.argsort(y, kind="stable")
+        threshold: int = self._get_vertical_threshold(h, scale=self._vertical_scale)
+        # find the position where each row starts
+        starts: list[int] = [0]
         y_ref: int = -1
-        for box in boxes:
+        for i, y_i in enumerate(y[order].tolist()):
             if y_ref == -1:
-                y_ref = box.y
-            elif abs(y_ref - box.y) <= threshold:
+                y_ref = y_i
+            elif abs(y_ref - y_i) <= threshold:
                 pass
             else:
                 y_ref = -1
-                line.sort(key=lambda box: box.x)
-                lines.append(line)
-                line = []
-            line.append(box)
-        line.sort(key=lambda box: box.x)
-        lines.append(line)
-        self._lines = lines
+                starts.append(i)
+        # elements in each grouped row should then be sorted left-to-right.
+        return [line[np.argsort(x[line], kind="stable")] for line in np.split(order, starts[1:])]
+
+    def _get_space_mask(self, line: np.ndarray) -> tuple[np.ndarray, int]:
+        """decide where to insert space in a line given by symbol indices.
+        space is inserted if two adjacent characters c1 and c2 satisfy distance(c1,c2)>threshold
+
+        Return:
+
+            1st: mask whose i-th element tells whether to insert space before the i-th symbol.
+
+            2nd: threshold used for the line.
+        """
+        x, y, w, h = (c[line] for c in self.get_symbols().get_columns())
+        thr: int = self._get_horizontal_threshold(x, y, w, h)
+        # the first symbol is compared with itself
+        x_last_end: np.ndarray = np.concatenate((x[:1], x[:-1])) + np.concatenate((w[:1], w[:-1]))
+        return x - x_last_end > thr, thr
+
+    def _get_space_masks(self, lines: list[np.ndarray]) -> np.ndarray:
+        """_get_space_mask of all the lines at once, concatenated in the order of the lines.
+        the thresholds of the lines are computed together, which is much faster than line by line for many lines.
+        """
+        lengths: np.ndarray = np.array([len(line) for line in lines])
+        starts: np.ndarray = np.cumsum(lengths) - lengths
+        line_ids: np.ndarray = np.repeat(np.arange(len(lines)), lengths)
+        x, y, w, h = (c[np.concatenate(lines)] for c in self.get_symbols().get_columns())
+        # the first symbol of each line is compared with itself
+        x_last_end: np.ndarray = np.concatenate((x[:1] + w[:1], x[:-1] + w[:-1]))
+        x_last_end[starts] = x[starts] + w[starts]
+        gaps: np.ndarray = x - x_last_end
+        is_interval: np.ndarray = np.ones(len(gaps), dtype=bool)
+        is_interval[starts] = False
+        thr_iqr: np.ndarray = self._get_horizontal_thresholds_iqr(
+            gaps[is_interval], line_ids[is_interval], len(lines), scale=self._iqr_scale
+        )
+        y_max: np.ndarray = np.maximum(np.maximum.reduceat(y + h, starts), 0)
+        y_min: np.ndarray = np.minimum(np.minimum.reduceat(y, starts), self._max_img_size)
+        thr_height: np.ndarray = np.floor(self._height_scale * np.abs(y_max - y_min).astype(np.float64))
+        return gaps > np.minimum(thr_iqr, thr_height)[line_ids]
+
+    def _get_horizontal_thresholds_iqr(
+        self, x_interval: np.ndarray, line_ids: np.ndarray, n_lines: int, scale: float = 1.5
+    ) -> np.ndarray:
+        """_get_horizontal_threshold_iqr of each line at once. x_interval of all the lines are given concatenated,
+        with the line of each interval. the quartiles are interpolated exactly as np.percentile does."""
+        thr: np.ndarray = np.full(n_lines, self._max_img_size, dtype=np.float64)
+        counts: np.ndarray = np.bincount(line_ids, minlength=n_lines)
+        has_interval: np.ndarray = counts > 0
+        if not has_interval.any():
+            return thr
+        # sorted within each line
+        sorted_interval: np.ndarray = x_interval[np.lexsort((x_interval, line_ids))].astype(np.float64)
+        n: np.ndarray = counts[has_interval]
+        offsets: np.ndarray = (np.cumsum(counts) - counts)[has_interval]
+        q3, q1 = (self.__interpolate(sorted_interval, offsets, n, q) for q in (0.75, 0.25))
+        thr[has_interval] = np.floor(q3 + scale * (q3 - q1))
+        return thr
+
+    @staticmethod
+    def __interpolate(values: np.ndarray, offsets: np.ndarray, n: np.ndarray, q: float) -> np.ndarray:
+        """q-quantile of each segment of sorted values, by the linear method of np.percentile."""
+        virtual: np.ndarray = (n - 1) * q
+        previous: np.ndarray = np.floor(virtual)
+        gamma: np.ndarray = virtual - previous
+        a: np.ndarray = values[offsets + previous.astype(np.intp)]
+        b: np.ndarray = values[offsets + np.minimum(previous.astype(np.intp) + 1, n - 1)]
+        diff_b_a: np.ndarray = b - a
+        return np.where(gamma >= 0.5, b - diff_b_a * (1 - gamma), a + diff_b_a * gamma)
+
+    def get_line_texts(self) -> list[str]:
+        """text of each line in the img, with space inserted.
+        this gives the same text as get_text without creating any Box object,
+        hence much faster when only text is needed.
+        """
+        if not self.is_response_set() or self.get_symbols().is_empty():
+            return []
+        lines: list[np.ndarray] = self._get_sorted_line_indices()
+        texts: list[str] = self.get_symbols().texts
+        pieces: list[str] = [texts[i] for i in np.concatenate(lines).tolist()]
+        for i in np.flatnonzero(self._get_space_masks(lines)).tolist():
+            pieces[i] = " " + pieces[i]
+        ends: list[int] = np.cumsum([len(line) for line in lines]).tolist()
+        return ["".join(pieces[start:end]) for start, end in zip([0] + ends[:-1], ends)]
+
+    def get_line_boxes(self) -> np.ndarray:
+        """x, y, width and height of the rect accommodating each line, in the order of get_line_texts.
+
+        Return:
+            int array of shape (the number of lines, 4).
+        """
+        if not self.is_response_set() or self.get_symbols().is_empty():
+            return np.empty((0, 4), dtype=Point_dtype)
+        x, y, w, h = self.get_symbols().get_columns()
+        lines: list[np.ndarray] = self._get_sorted_line_indices()
+        boxes = np.empty((len(lines), 4), dtype=Point_dtype)
+        for i, line in enumerate(lines):
+            x0, y0 = x[line].min(), y[line].min()
+            boxes[i] = (x0, y0, (x[line] + w[line]).max() - x0, (y[line] + h[line]).max() - y0)
+        return boxes
+
+    def _set_sorted_lines(self):
+        """set self.lines property.
+        self.lines is an empty list until this method is called.
+        elements in each line in self.lines corresponds to
+        those in the each line in the img.
+        """
+        symbols: Symbols = self.get_symbols()
+        # store recognized elements
+        boxes: list[Box] = [
+            Box(text, Rect(((x, y), w, h)))
+            for text, x, y, w, h in zip(symbols.texts, *(c.tolist() for c in symbols.get_columns()))
+        ]
+        self._lines = [[boxes[i] for i in line.tolist()] for line in self._get_sorted_line_indices()]
 
     def _get_lines_with_inserted_space(self) -> list[list[Box]]:
         """insert space between each character in line for all line in lines.
@@ -168,16 +443,15 @@ class OCR(IOCR):
         """
         # insert
         lines: list[list[Box]] = []
-        for line in self._lines:
+        for line, indices in zip(self._lines, self._get_sorted_line_indices()):
             if line == []:
                 continue
-            thr: int = self._get_horizontal_threshold(line)
+            mask, thr = self._get_space_mask(indices)
             new_line: list[Box] = []
             box_last: Box = line[0]
-            for box in line:
-                # compare current box and the last box
-                # if they are distanced enough, a space character is inserted
-                if box.x - (box_last.x + box_last.width) > thr:
+            for box, insert in zip(line, mask.tolist()):
+                # if the current box and the last box are distanced enough, a space character is inserted
+                if insert:
                     # create space box that lies between these two boxes
                     # at the time of writing, width and height of the new rect is not interesting
                     # because they are no longer used for any of the process that follow
@@ -204,7 +478,7 @@ class OCR(IOCR):
             self._lines[i] = [Box(text=text_merged, rect=rect)]
 
     def get_text(self) -> str:
-        if not self.is_response_set():
+        if not self.is_response_set() or self.get_symbols().is_empty():
             print("no response is set. the input file includes blank page?")
             return ""
         if self.get_lines() == []:
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import Final
+
+import cv2
+import numpy as np
+
+from OCR_by_google import OCR, decode_img
+from Symbols import Symbols
+from Type_Alias import Mat, Path
+
+try:
+    import pytesseract
+except ImportError:  # optional dependency
+    pytesseract = None
+
+
+def decode_gray_img(content: bytes) -> Mat:
+    """decode an encoded img in gray, as tesseract reads it. ValueError is raised if it cannot be decoded."""
+    img: Mat = decode_img(content)
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+
+class Local_OCR(OCR):
+    """OCR that recognizes symbols by local tesseract instead of the Vision API.
+    only the way to get symbols differs. the line layout is that of OCR.
+    """
+
+    def __init__(self, lang: str = "eng", **kwargs) -> None:
+        """
+        Args:
+            lang: language of tesseract, like 'eng' or 'eng+fra'.
+
+            kwargs: passed to OCR.
+        """
+        if pytesseract is None:
+            raise ImportError("Local_OCR requires pytesseract and tesseract. Install them to use the local engine.")
+        super().__init__(**kwargs)
+        self._lang: Final[str] = lang
+
+    def read_img(self, img_path: Path) -> None:
+        """set symbols by reading image file. no limit of the api applies."""
+        self.read_bytes(self.get_byte_img(img_path))
+
+    def read_bytes(self, content: bytes) -> None:
+        """set symbols by reading encoded image with tesseract."""
+        if len(content) == 0:
+            raise ValueError("Invalid img size. Got 0 MB.")
+        self.read_symbols(self.get_symbols_of_img(decode_gray_img(content)))
+
+    def get_symbols_of_img(self, img: Mat) -> Symbols:
+        """character boxes of tesseract. their origin is the lower-left corner of the img."""
+        boxes = pytesseract.image_to_boxes(img, lang=self._lang, output_type=pytesseract.Output.DICT)
+        if not boxes or "char" not in boxes:
+            return Symbols()
+        left, bottom, right, top = (np.array(boxes[k], dtype=np.int64) for k in ("left", "bottom", "right", "top"))
+        height: int = img.shape[0]
+        return Symbols(boxes["char"], left, np.maximum(0, height - top), right - left, top - bottom)
@@ -0,0 +1,47 @@
+import re
+from typing import Final
+
+# one term of page selection, such as '3', '2-5', '-10', '10-', '1-100/5' or '/3'.
+_term: Final = re.compile(r"^(?:(\d+)|(\d*)-(\d*))?(?:/(\d+))?$")
+
+
+def parse_pages(spec: str, n_pages: int) -> list[int]:
+    """parse page selection into sorted 0-based page indices.
+
+    Args:
+        spec: comma separated terms of 1-based page numbers. each term is one of
+        'n' (page n), 'a-b' (pages a to b), '-b' (the first b pages), 'a-' (page a to the last),
+        optionally followed by '/k' to take every k-th page of the range.
+        '/k' alone takes every k-th page of the whole document.
+        e.g. '1-5,8', '-10', '1-100/10', '/5'.
+
+        n_pages: the number of pages in the document. pages beyond it are ignored.
+    """
+    selected: set[int] = set()
+    for term in spec.replace(" ", "").split(","):
+        m = _term.match(term)
+        if term == "" or m is None:
+            raise ValueError(f"Invalid page selection '{term}' in '{spec}'.")
+        single, first, last, step = m.groups()
+        if single is not None:
+            first = last = single
+        start: int = int(first) if first else 1
+        stop: int = int(last) if last else max(start, n_pages)
+        if start < 1 or stop < start or step == "0":
+            raise ValueError(f"Invalid page range '{term}' in '{spec}'.")
+        selected.update(range(start - 1, min(stop, n_pages), int(step) if step else 1))
+    if not selected:
+        raise ValueError(f"No page selected by '{spec}' out of {n_pages} pages.")
+    return sorted(selected)
+
+
+def get_runs(pages: list[int]) -> list[tuple[int, int]]:
+    """split sorted page indices into runs of consecutive pages.
+    each run is given by its first and last index."""
+    runs: list[tuple[int, int]] = []
+    for p in pages:
+        if runs and runs[-1][1] + 1 == p:
+            runs[-1] = (runs[-1][0], p)
+        else:
+            runs.append((p, p))
+    return runs
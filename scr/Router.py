@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import cpu_count
+from typing import Final, Optional
+
+from Hedge import Hedge
+from OCR_by_google import OCR
+from OCR_by_tesseract import Local_OCR, decode_gray_img, pytesseract
+from Type_Alias import Mat, Paths
+
+# routes
+LOCAL: Final = "local"
+VISION: Final = "vision"
+
+
+class Router:
+    """send each page either to local tesseract or to the Vision API.
+    pages tesseract detects as written in Latin script, and pages with too few characters to detect,
+    are read locally on local cores in parallel. the others, e.g., Japanese pages, are sent to the Vision API.
+    """
+
+    def __init__(
+        self,
+        lang: str = "eng",
+        tile: bool = False,
+        min_script_conf: float = 2.0,
+        local_workers: Optional[int] = None,
+        vision_workers: int = 4,
+        crop: bool = False,
+        hedge: Optional[Hedge] = None,
+    ) -> None:
+        """
+        Args:
+            lang: language of tesseract for the pages read locally.
+
+            tile: passed to OCR and Local_OCR.
+
+            min_script_conf: confidence of tesseract's script detection above which a Latin page is read locally.
+
+            local_workers: the number of pages read locally at once. the default uses the number of cpus.
+
+            vision_workers: the number of requests to the Vision API at once.
+
+            crop, hedge: passed to OCR for the pages sent to the Vision API.
+        """
+        if pytesseract is None:
+            raise ImportError("Router requires pytesseract and tesseract. Install them to use the local engine.")
+        self.__lang: Final[str] = lang
+        self.__tile: Final[bool] = tile
+        self.__min_script_conf: Final[float] = min_script_conf
+        self.__local_workers: Final[int] = (cpu_count() or 1) if local_workers is None else local_workers
+        self.__vision_workers: Final[int] = vision_workers
+        self.__crop: Final[bool] = crop
+        self.__hedge: Final[Optional[Hedge]] = hedge
+
+    def route(self, content: bytes) -> str:
+        """LOCAL or VISION by the script of the encoded img."""
+        img: Mat = decode_gray_img(content)
+        try:
+            osd = pytesseract.image_to_osd(img, output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractError as e:
+            # almost blank page is not worth a request
+            return LOCAL if "Too few characters" in str(e) else VISION
+        return LOCAL if osd["script"] == "Latin" and osd["script_conf"] >= self.__min_script_conf else VISION
+
+    def read_imgs(self, img_paths: Paths) -> list[OCR]:
+        """read imgs, each by the engine it is routed to.
+
+        Return:
+            OCR objects with symbols or response set, in the order of img_paths.
+        """
+        return self.read_contents([p.read_bytes() for p in img_paths])
+
+    def read_contents(self, contents: list[bytes]) -> list[OCR]:
+        """read encoded imgs, each by the engine it is routed to.
+
+        Return:
+            OCR objects with symbols or response set, in the order of contents.
+        """
+        with ThreadPoolExecutor(self.__local_workers) as local, ThreadPoolExecutor(self.__vision_workers) as vision:
+            routes: list[str] = list(local.map(self.route, contents))
+            futures: list[Future[OCR]] = [
+                (
+                    local.submit(self.__read, Local_OCR(lang=self.__lang, tile=self.__tile), content)
+                    if route == LOCAL
+                    else vision.submit(
+                        self.__read, OCR(tile=self.__tile, crop=self.__crop, hedge=self.__hedge), content
+                    )
+                )
+                for route, content in zip(routes, contents)
+            ]
+            return [f.result() for f in futures]
+
+    def __read(self, ocr: OCR, content: bytes) -> OCR:
+        ocr.read_bytes(content)
+        return ocr
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import Final, Iterable, Optional
+
+import numpy as np
+from google.cloud.vision_v1.types.image_annotator import AnnotateImageResponse as Response
+
+from Type_Alias import Path, Point_dtype
+
+
+class Symbols:
+    """columnar storage of the symbols recognized in a single page.
+    holds only what the line layout needs, i.e., the text and the upper-left corner,
+    width and height of the bounding box of each symbol, and the confidence of the recognition.
+    """
+
+    # class var
+    columns: Final = ("x", "y", "w", "h")
+
+    def __init__(
+        self,
+        texts: Iterable[str] = (),
+        x: Iterable[int] = (),
+        y: Iterable[int] = (),
+        w: Iterable[int] = (),
+        h: Iterable[int] = (),
+        conf: Optional[Iterable[float]] = None,
+    ) -> None:
+        """
+        Args:
+            conf: confidence of each symbol in [0, 1]. the default uses 1 for engines that give none.
+        """
+        self.texts: list[str] = list(texts)
+        self.x: np.ndarray = self.__to_column(x)
+        self.y: np.ndarray = self.__to_column(y)
+        self.w: np.ndarray = self.__to_column(w)
+        self.h: np.ndarray = self.__to_column(h)
+        self.conf: np.ndarray = (
+            np.ones(len(self.texts), dtype=np.float32)
+            if conf is None
+            else np.asarray(conf if isinstance(conf, (np.ndarray, list, tuple)) else list(conf), dtype=np.float32)
+        )
+        if not all(len(self.texts) == len(c) for c in (self.x, self.y, self.w, self.h, self.conf)):
+            raise ValueError("Symbols failed to initialize. columns must have the same length.")
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __to_column(self, values: Iterable[int]) -> np.ndarray:
+        return np.asarray(values if isinstance(values, (np.ndarray, list, tuple)) else list(values), dtype=Point_dtype)
+
+    def is_empty(self) -> bool:
+        return len(self) == 0
+
+    @classmethod
+    def from_response(cls, res: Response) -> Symbols:
+        """collect symbols in the response. the block/paragraph structure is ignored.
+        the raw protobuf message under the proto-plus wrapper is traversed,
+        since every attribute access through the wrapper creates a new wrapper object.
+        """
+        pages = Response.pb(res).full_text_annotation.pages
+        n: int = sum(
+            len(word.symbols)
+            for page in pages
+            for block in page.blocks
+            for paragraph in block.paragraphs
+            for word in paragraph.words
+        )
+        texts: list[str] = [""] * n
+        # x0, y0, x1 and y3 of the vertices of each symbol
+        corners = np.empty((n, 4), dtype=Point_dtype)
+        conf = np.empty(n, dtype=np.float32)
+        i: int = 0
+        for page in pages:
+            for block in page.blocks:
+                for paragraph in block.paragraphs:
+                    for word in paragraph.words:
+                        for symbol in word.symbols:
+                            ver = symbol.bounding_box.vertices
+                            texts[i] = symbol.text
+                            corners[i] = (ver[0].x, ver[0].y, ver[1].x, ver[3].y)
+                            conf[i] = symbol.confidence
+                            i += 1
+        x, y, x1, y3 = corners.T
+        return cls(texts, np.maximum(0, x), np.maximum(0, y), x1 - x, y3 - y, conf)
+
+    def get_columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return self.x, self.y, self.w, self.h
+
+    def get_confidence(self) -> float:
+        """mean confidence of the symbols. nan if empty."""
+        return float(self.conf.mean()) if not self.is_empty() else float("nan")
+
+    def shift(self, dx: int, dy: int) -> Symbols:
+        """symbols moved by (dx, dy), e.g., from the coordinates of a part of an img to those of the whole."""
+        return Symbols(self.texts, self.x + dx, self.y + dy, self.w, self.h, self.conf)
+
+    def select(self, mask: np.ndarray) -> Symbols:
+        """symbols where mask is true."""
+        return Symbols(
+            [t for t, m in zip(self.texts, mask.tolist()) if m],
+            *(c[mask] for c in self.get_columns()),
+            self.conf[mask],
+        )
+
+    @classmethod
+    def concat(cls, symbols: list[Symbols]) -> Symbols:
+        empty = np.empty(0, dtype=Point_dtype)
+        return cls(
+            [t for s in symbols for t in s.texts],
+            *(np.concatenate([getattr(s, c) for s in symbols] + [empty]) for c in Symbols.columns),
+            np.concatenate([s.conf for s in symbols] + [np.empty(0, dtype=np.float32)]),
+        )
+
+
+def save_symbols(pages: list[Symbols], path: Path, page_numbers: list[int] | None = None) -> Path:
+    """save symbols of pages in a single compressed npz file.
+    columns of all the pages are concatenated and split again by the offsets on loading.
+
+    Args:
+        pages: symbols of each page, in page order.
+
+        path: path of the output file. the suffix is replaced with '.npz'.
+
+        page_numbers: page number of each page. the default uses 0, 1, 2, ...
+    """
+    path = path.with_suffix(".npz")
+    numbers: list[int] = list(range(len(pages))) if page_numbers is None else page_numbers
+    assert len(numbers) == len(pages)
+    offsets = np.cumsum([0] + [len(p) for p in pages]).astype(np.int64)
+    merged: Symbols = Symbols.concat(pages)
+    np.savez_compressed(
+        str(path),
+        offsets=offsets,
+        pages=np.array(numbers, dtype=np.int64),
+        texts=np.array(merged.texts, dtype=str),
+        conf=merged.conf,
+        **{c: getattr(merged, c) for c in Symbols.columns},
+    )
+    return path
+
+
+def load_symbols(path: Path) -> tuple[list[Symbols], list[int]]:
+    """load symbols saved by save_symbols.
+
+    Return:
+
+        1st: symbols of each page.
+
+        2nd: page number of each page.
+    """
+    with np.load(str(path), allow_pickle=False) as npz:
+        offsets = npz["offsets"]
+        texts: list[str] = npz["texts"].tolist()
+        x, y, w, h = (npz[c] for c in Symbols.columns)
+        # files saved before confidence was stored
+        conf = npz["conf"] if "conf" in npz.files else np.ones(len(texts), dtype=np.float32)
+        numbers: list[int] = npz["pages"].tolist()
+    pages: list[Symbols] = []
+    for s, e in zip(offsets[:-1], offsets[1:]):
+        pages.append(Symbols(texts[s:e], x[s:e], y[s:e], w[s:e], h[s:e], conf[s:e]))
+    return pages, numbers
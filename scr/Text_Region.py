@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import cv2
+import numpy as np
+
+from Rect import Rect, Rects
+from Type_Alias import Contours, Mat
+
+
+def get_text_region(img: Mat, margin: int = 16, kernel_size: int = 25, min_area_ratio: float = 0.00002) -> Rect:
+    """find the rect accommodating the text in a scanned page.
+    dark pixels are joined by morphological closing into blobs of lines and paragraphs.
+    blobs touching the border of the img without anything sized like a character,
+    like gutter shadows and edges of the scan, and blobs too small to be text are ignored.
+    a blob of text is kept even if it touches the border, so that no text is cut off.
+
+    Args:
+        img: gray or colored img.
+
+        margin: pixels added around the found region.
+
+        kernel_size: size of the kernel of closing. it should be larger than gaps between characters.
+
+        min_area_ratio: blobs whose area ratio to the img is under this are ignored.
+
+    Return:
+        the region, or the whole img if no text is found.
+    """
+    if img.ndim == 2:
+        gray: Mat = img
+    else:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    whole = Rect(((0, 0), width, height))
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel: Mat = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
+    closed: Mat = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    rects: list[Rect] = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h < min_area_ratio * width * height:
+            continue
+        if (x == 0 or y == 0 or x + w == width or y + h == height) and not has_chars(binary, contour, kernel_size):
+            continue
+        rects.append(Rect(((x, y), w, h)))
+    if rects == []:
+        return whole
+    corners: Contours = Rects(rects).get_contours()
+    x0, y0 = np.maximum(corners.min(axis=(0, 1, 2)) - margin, 0).tolist()
+    x1, y1 = np.minimum(corners.max(axis=(0, 1, 2)) + margin, [width, height]).tolist()
+    return Rect(((x0, y0), x1 - x0, y1 - y0))
+
+
+def has_chars(binary: Mat, contour: Mat, kernel_size: int = 25) -> bool:
+    """whether the dark pixels inside a contour in a binary img, whose dark pixels are nonzero,
+    include a connected component sized like a character.
+    it is at least a fifth of kernel_size high and at most 8 times kernel_size wide and high,
+    unlike specks, shadows and rules.
+    """
+    x, y, w, h = cv2.boundingRect(contour)
+    mask: Mat = np.zeros((h, w), dtype=np.uint8)
+    cv2.drawContours(mask, [contour], -1, 255, thickness=cv2.FILLED, offset=(-x, -y))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary[y : y + h, x : x + w] & mask, connectivity=8)
+    # the first is the background
+    widths, heights = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    return bool(np.any((heights >= max(kernel_size // 5, 2)) & (np.maximum(widths, heights) <= 8 * kernel_size)))
+
+
+def crop_to_text_region(content: bytes, margin: int = 16) -> tuple[bytes, tuple[int, int]]:
+    """crop an encoded img to its text region, encoded in the same format.
+
+    Return:
+
+        1st: the cropped img, or content itself if cropping does not make it smaller.
+
+        2nd: the upper-left corner of the cropped img in the original img,
+        by which symbols in the cropped img are shifted back.
+    """
+    img: Mat = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return content, (0, 0)
+    region: Rect = get_text_region(img, margin=margin)
+    if (region.width, region.height) == (img.shape[1], img.shape[0]):
+        return content, (0, 0)
+    x, y = int(region.x), int(region.y)
+    fmt: str = ".jpg" if content[:3] == b"\xff\xd8\xff" else ".png"
+    cropped: bytes = cv2.imencode(fmt, img[y : y + region.height, x : x + region.width])[1].tobytes()
+    if len(cropped) >= len(content):
+        return content, (0, 0)
+    return cropped, (x, y)
@@ -0,0 +1,46 @@
+from typing import NamedTuple
+
+
+class Tile(NamedTuple):
+    """a part of an img to be read separately.
+    the core is the region which this tile is responsible for.
+    cores of the tiles of an img partition the img without any overlap.
+    """
+
+    x: int
+    y: int
+    width: int
+    height: int
+    core_x: tuple[int, int]
+    core_y: tuple[int, int]
+
+
+def split_axis(length: int, size: int, overlap: int) -> list[tuple[int, int, int, int]]:
+    """split [0, length) into intervals of the size overlapping each other by the overlap.
+
+    Return:
+        start, stop, and start and stop of the core of each interval.
+        the core is the interval whose both ends are trimmed by half the overlap, except the ends of [0, length).
+    """
+    assert 0 <= overlap < size
+    if length <= size:
+        return [(0, length, 0, length)]
+    stride: int = size - overlap
+    starts: list[int] = list(range(0, length - size, stride)) + [length - size]
+    intervals: list[tuple[int, int, int, int]] = []
+    for i, start in enumerate(starts):
+        core_start: int = 0 if i == 0 else intervals[-1][3]
+        core_stop: int = length if i == len(starts) - 1 else (start + size + starts[i + 1]) // 2
+        intervals.append((start, start + size, core_start, core_stop))
+    return intervals
+
+
+def get_tiles(width: int, height: int, size: int, overlap: int) -> list[Tile]:
+    """split an img of width x height into square tiles of the size overlapping each other by the overlap.
+    the overlap must be larger than any symbol in the img so that every symbol is wholly in the tile of its core.
+    """
+    return [
+        Tile(x, y, x_stop - x, y_stop - y, (cx0, cx1), (cy0, cy1))
+        for y, y_stop, cy0, cy1 in split_axis(height, size, overlap)
+        for x, x_stop, cx0, cx1 in split_axis(width, size, overlap)
+    ]
@@ -0,0 +1,63 @@
+"""benchmark of hedged requests against a local stub of the api with heavy-tailed latency.
+
+usage:
+    python bench_hedge.py [n_pages] [seed]
+
+every page goes through OCR.read_bytes, with _annotate replaced by the stub.
+the latency of the stub is log-normal around 20 ms, and a few requests straggle 10-50 times longer,
+independently of each other like requests landing on a slow server.
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from typing import Optional
+
+import numpy as np
+from google.cloud.vision_v1.types.image_annotator import AnnotateImageResponse as Response
+
+from Hedge import Hedge
+from OCR_by_google import OCR
+
+
+class Stub_OCR(OCR):
+    rng = np.random.default_rng(0)
+    lock = threading.Lock()
+
+    def _annotate(self, content: bytes) -> Response:
+        with Stub_OCR.lock:
+            latency: float = Stub_OCR.rng.lognormal(np.log(0.02), 0.3)
+            if Stub_OCR.rng.random() < 0.03:
+                latency *= Stub_OCR.rng.uniform(10, 50)
+        sleep(latency)
+        return Response()
+
+
+def run(n_pages: int, hedge: Optional[Hedge], workers: int = 8) -> np.ndarray:
+    """read n_pages with workers concurrent pages and return the latency of each page in seconds."""
+
+    def read(_: int) -> float:
+        start: float = perf_counter()
+        Stub_OCR(hedge=hedge).read_bytes(b"page")
+        return perf_counter() - start
+
+    with ThreadPoolExecutor(workers) as executor:
+        return np.array(list(executor.map(read, range(n_pages))))
+
+
+if __name__ == "__main__":
+    n_pages: int = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seed: int = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    for name, hedge in [("no hedge", None), ("hedge p95", Hedge())]:
+        Stub_OCR.rng = np.random.default_rng(seed)
+        start: float = perf_counter()
+        latencies: np.ndarray = run(n_pages, hedge) * 1000
+        total: float = perf_counter() - start
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(
+            f"{name:>9}: p50 {p50:6.1f} ms, p95 {p95:6.1f} ms, p99 {p99:6.1f} ms, "
+            + f"max {latencies.max():6.1f} ms, total {total:5.2f} s"
+        )
+        if hedge is not None:
+            hedge.print_stats()
@@ -0,0 +1,58 @@
+"""benchmark of rendering pdf pages and encoding them into png, as ocr reads a pdf file:
+pdftoppm subprocess vs in-process pdfium.
+
+usage:
+    python bench_render.py [dpi] [file.pdf ...]
+
+the default renders sample/fa.pdf and sample/missing_data.pdf at 200 dpi, the dpi ocr uses for pdf files.
+each run renders and encodes all the pages of a file one at a time by a fresh Convertor,
+through iter_pdf_pages_byte as ocr does. pixels are compared on the decoded pngs.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from Convertor import PDFIUM, POPPLER, Convertor
+from File import File
+from OCR_by_google import decode_img
+from Type_Alias import Mat, Path
+
+
+def render(path: Path, dpi: int, renderer: str) -> list[bytes]:
+    f = File()
+    f.read_file(path)
+    c = Convertor(dpi=dpi, renderer=renderer)
+    c.read_file(f)
+    return list(c.iter_pdf_pages_byte())
+
+
+if __name__ == "__main__":
+    dpi: int = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sample: Path = Path(__file__).resolve().parent.parent / "sample"
+    paths: list[Path] = (
+        [Path(p) for p in sys.argv[2:]] if len(sys.argv) > 2 else [sample / "fa.pdf", sample / "missing_data.pdf"]
+    )
+    for path in paths:
+        results: dict[str, list[Mat]] = {}
+        for renderer in (POPPLER, PDFIUM):
+            try:
+                contents: list[bytes] = render(path, dpi, renderer)
+            except Exception as e:
+                print(f"{path.name}: {renderer:>7} unavailable. {type(e).__name__}: {e}")
+                continue
+            imgs: list[Mat] = [decode_img(content) for content in contents]
+            results[renderer] = imgs
+            n, total = timeit.Timer(lambda: render(path, dpi, renderer)).autorange()
+            mp: float = sum(img.size for img in imgs) / 10**6
+            print(
+                f"{path.name}: {renderer:>7} {total / n * 1000:8.1f} ms per file, "
+                + f"{total / n / len(imgs) * 1000:7.1f} ms per page, {len(imgs)} pages of {mp / len(imgs):.1f} MP"
+            )
+        if len(results) == 2:
+            diffs: list[float] = [
+                float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean()) if a.shape == b.shape else float("nan")
+                for a, b in zip(results[POPPLER], results[PDFIUM])
+            ]
+            print(f"{path.name}: mean absolute difference of pixels per page {np.round(diffs, 2).tolist()}")
@@ -0,0 +1,73 @@
+"""benchmark of collecting symbols from responses: proto-plus traversal vs raw protobuf traversal.
+
+usage:
+    python bench_symbols.py [response.pb ...]
+
+each argument is a recorded response serialized by
+    Response.serialize(ocr.response)
+and saved as bytes after OCR.read_img. without arguments, a dense synthetic page is used.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+from google.cloud.vision_v1.types.image_annotator import AnnotateImageResponse as Response
+
+from Symbols import Symbols
+from Type_Alias import Path
+
+
+def from_response_proto_plus(res: Response) -> Symbols:
+    """the former traversal through proto-plus wrappers."""
+    texts: list[str] = []
+    xs: list[int] = []
+    ys: list[int] = []
+    ws: list[int] = []
+    hs: list[int] = []
+    for page in res.full_text_annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    for symbol in word.symbols:
+                        ver = symbol.bounding_box.vertices
+                        x: int = ver[0].x
+                        y: int = ver[0].y
+                        texts.append(symbol.text)
+                        xs.append(max(0, x))
+                        ys.append(max(0, y))
+                        ws.append(ver[1].x - x)
+                        hs.append(ver[3].y - y)
+    return Symbols(texts, xs, ys, ws, hs)
+
+
+def get_synthetic_response(n_lines: int = 40, n_chars: int = 50) -> Response:
+    """a page of n_lines x n_chars symbols, a word of 5 symbols each."""
+    words = []
+    for line in range(n_lines):
+        for start in range(0, n_chars, 5):
+            symbols = []
+            for c in range(start, start + 5):
+                x, y = 20 + 24 * c, 30 + 40 * line
+                vertices = [dict(x=x, y=y), dict(x=x + 20, y=y), dict(x=x + 20, y=y + 20), dict(x=x, y=y + 20)]
+                symbols.append(dict(text=chr(0x3042 + c % 80), bounding_box=dict(vertices=vertices)))
+            words.append(dict(symbols=symbols))
+    return Response(full_text_annotation=dict(pages=[dict(blocks=[dict(paragraphs=[dict(words=words)])])]))
+
+
+def is_same(s1: Symbols, s2: Symbols) -> bool:
+    return s1.texts == s2.texts and all(np.array_equal(c1, c2) for c1, c2 in zip(s1.get_columns(), s2.get_columns()))
+
+
+if __name__ == "__main__":
+    responses: list[Response] = (
+        [Response.deserialize(Path(p).read_bytes()) for p in sys.argv[1:]]
+        if len(sys.argv) > 1
+        else [get_synthetic_response()]
+    )
+    n_symbols: int = sum(len(Symbols.from_response(r)) for r in responses)
+    assert all(is_same(from_response_proto_plus(r), Symbols.from_response(r)) for r in responses)
+    print(f"{len(responses)} responses, {n_symbols} symbols")
+    for name, func in [("proto-plus", from_response_proto_plus), ("raw protobuf", Symbols.from_response)]:
+        n, total = timeit.Timer(lambda: [func(r) for r in responses]).autorange()
+        print(f"{name:>12}: {total / n * 1000:8.2f} ms per run, {total / n / n_symbols * 10**6:6.2f} us per symbol")
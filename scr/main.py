@@ -1,13 +1,28 @@
-from typing import Optional
+import itertools
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Optional
 
-from Convertor import Convertor
+from Convertor import POPPLER, Convertor
+from Estimate import estimate_files, print_estimates
 from File import File
+from Hedge import Hedge
 from OCR_by_google import OCR
+from OCR_by_tesseract import Local_OCR
+from Pages import parse_pages
+from Router import Router
+from Symbols import Symbols, load_symbols, save_symbols
 from Type_Alias import Path, Paths
 
 
 # for preview
-def preview_files(file_or_dir: Path | str, ext: str = "png"):
+def preview_files(
+    file_or_dir: Path | str,
+    ext: str = "png",
+    plan: bool = False,
+    pages: Optional[str] = None,
+    tile: bool = False,
+    zips: bool = False,
+):
     """preview information of files that will be read by ocr.
 
     Args:
@@ -15,11 +30,42 @@ def preview_files(file_or_dir: Path | str, ext: str = "png"):
 
         ext: file extension you intend.
         used only when you provide a directory path.
+
+        plan: whether to print the number of requests and the upload size that ocr would make
+        for each document and in total, instead. nothing is rendered or extracted.
+        a directory gives its img files of the ext as a single document, as ocr reads it.
+
+        pages, tile: see ocr_by_cloud_vision_api. used only when plan is true.
+
+        zips: whether a directory gives each zip file in it instead, as zocr reads it. used only when plan is true.
     """
+    if plan:
+        print_estimates(estimate_files(Path(file_or_dir), ext=ext, pages=pages, tile=tile, zips=zips))
+        return
     get_file_obj(file_or_dir, ext, expand=False)[0].print()
 
 
-def get_file_obj(file_or_dir: Path | str, ext: str = "png", expand: bool = True) -> tuple[File, File]:
+def get_page_indices(f: File, pages: Optional[str]) -> Optional[list[int]]:
+    """0-based indices of the pages in a pdf or zip file selected by pages.
+    None if pages is None. see Pages.parse_pages for the format."""
+    if pages is None:
+        return None
+    if f.is_pdf_file():
+        n_pages: int = f.n_pages(f.paths[0])
+    elif f.is_compressed_file():
+        n_pages = len(f.get_zip_img_names())
+    else:
+        raise ValueError(f"Pages can be selected only in pdf or zip file. Got {f.ext}.")
+    return parse_pages(pages, n_pages)
+
+
+def get_file_obj(
+    file_or_dir: Path | str,
+    ext: str = "png",
+    expand: bool = True,
+    pages: Optional[str] = None,
+    renderer: str = POPPLER,
+) -> tuple[File, File]:
     """get file objects that holds the directory structure of intended path.
 
     Args:
@@ -32,6 +78,12 @@ def get_file_obj(file_or_dir: Path | str, ext: str = "png", expand: bool = True)
         in a new directory and return the directory
         as the second of the returned values.
 
+        pages: selection of the pages to expand, like '1-5,8'. see Pages.parse_pages for the format.
+        used only when expand is true and the path is a zip or pdf file.
+        the default expands all the pages.
+
+        renderer: renderer of pdf pages. see Convertor.
+
     Return:
 
         1st: File object of the file_or_dir.
@@ -53,30 +105,228 @@ def get_file_obj(file_or_dir: Path | str, ext: str = "png", expand: bool = True)
     # expand compressed file
     else:
         f_read: File = f
+        indices: Optional[list[int]] = get_page_indices(f, pages)
         if f.is_compressed_file():
-            f_read = f.get_unzip_file()
+            f_read = f.get_unzip_file(pages=indices)
         elif f.is_pdf_file():
-            c = Convertor()
+            c = Convertor(pages=indices, renderer=renderer)
             c.read_file(f)
             f_read = c.save_pdf_pages()
         return f, f_read
 
 
-def get_text_from_imgs(img_paths: Paths) -> str:
-    """concatenate all the read text of images."""
-    texts: list[str] = []
+def read_imgs(
+    img_paths: Paths,
+    tile: bool = False,
+    engine: str = "vision",
+    lang: str = "eng",
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+) -> list[OCR]:
+    """read images by the engine.
+
+    Args:
+        img_paths: paths of images, in page order.
+
+        tile: whether to read images too large for the api by splitting them into tiles.
+
+        engine: 'vision' reads all the images by the Vision API, 'local' by local tesseract,
+        and 'auto' reads Latin-only images locally and the others by the Vision API. see Router.
+
+        lang: language of tesseract. used only when engine is 'local' or 'auto'.
+
+        crop: whether to crop images to their text region before uploading them.
+        images read by tesseract are not cropped.
+
+        hedge: if provided, requests to the api slower than its latency percentile are sent again. see Hedge.
+
+    Return:
+        OCR objects that have read each image.
+    """
+    if engine == "auto":
+        return Router(lang=lang, tile=tile, crop=crop, hedge=hedge).read_imgs(img_paths)
+    if engine not in ("vision", "local"):
+        raise ValueError(f"Invalid engine {engine}. It must be vision, local or auto.")
+    ocrs: list[OCR] = []
     for img_path in img_paths:
-        ocr = OCR()
+        ocr = OCR(tile=tile, crop=crop, hedge=hedge) if engine == "vision" else Local_OCR(lang=lang, tile=tile)
         ocr.read_img(img_path=img_path)
+        ocrs.append(ocr)
+    return ocrs
+
+
+def read_contents(
+    contents: Iterable[bytes],
+    tile: bool = False,
+    engine: str = "vision",
+    lang: str = "eng",
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+) -> list[OCR]:
+    """read encoded images, e.g., png or jpeg bytes, by the engine.
+
+    Args:
+        contents: encoded images, in page order. an iterator is consumed one image at a time,
+        except that 'auto' engine takes all of them at once to route them.
+
+        tile, engine, lang, crop, hedge: see read_imgs.
+
+    Return:
+        OCR objects that have read each image.
+    """
+    if engine == "auto":
+        return Router(lang=lang, tile=tile, crop=crop, hedge=hedge).read_contents(list(contents))
+    if engine not in ("vision", "local"):
+        raise ValueError(f"Invalid engine {engine}. It must be vision, local or auto.")
+    ocrs: list[OCR] = []
+    for content in contents:
+        ocr = OCR(tile=tile, crop=crop, hedge=hedge) if engine == "vision" else Local_OCR(lang=lang, tile=tile)
+        ocr.read_bytes(content)
+        ocrs.append(ocr)
+    return ocrs
+
+
+def read_pdf(
+    f: File,
+    pages: Optional[list[int]] = None,
+    dpi: int = 200,
+    tile: bool = False,
+    engine: str = "vision",
+    lang: str = "eng",
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+    renderer: str = POPPLER,
+) -> list[OCR]:
+    """read pdf pages rendered in memory, without saving them as img files.
+    each page is rendered, encoded and read one at a time.
+
+    Args:
+        f: File object of a pdf file.
+
+        pages: 0-based indices of the pages to read. the default reads all.
+
+        dpi: resolution by which the pages are rendered.
+
+        tile, engine, lang, crop, hedge: see read_imgs.
+
+        renderer: renderer of pdf pages. see Convertor.
+
+    Return:
+        OCR objects that have read each page.
+    """
+    if not f.is_pdf_file():
+        raise ValueError(f"Expected pdf file. Got {f.ext}.")
+    c = Convertor(pages=pages, dpi=dpi, renderer=renderer)
+    c.read_file(f)
+    return read_contents(c.iter_pdf_pages_byte(), tile=tile, engine=engine, lang=lang, crop=crop, hedge=hedge)
+
+
+def get_text_from_imgs(
+    img_paths: Paths,
+    symbols_out: Optional[list[Symbols]] = None,
+    tile: bool = False,
+    engine: str = "vision",
+    lang: str = "eng",
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+) -> str:
+    """concatenate all the read text of images.
+
+    Args:
+        img_paths: paths of images, in page order.
+
+        symbols_out: if provided, symbols recognized in each page are appended to it.
+
+        tile, engine, lang, crop, hedge: see read_imgs.
+    """
+    ocrs: list[OCR] = read_imgs(img_paths, tile=tile, engine=engine, lang=lang, crop=crop, hedge=hedge)
+    return get_text_from_ocrs(ocrs, symbols_out=symbols_out)
+
+
+def get_text_from_ocrs(ocrs: list[OCR], symbols_out: Optional[list[Symbols]] = None) -> str:
+    """concatenate all the read text of OCR objects that have read each page.
+
+    Args:
+        symbols_out: if provided, symbols recognized in each page are appended to it.
+    """
+    texts: list[str] = []
+    for ocr in ocrs:
         texts.append(ocr.get_text())
+        if symbols_out is not None:
+            symbols_out.append(ocr.get_symbols())
     return "\n".join(texts)
 
 
+def read_pdf_adaptively(
+    f: File,
+    pages: Optional[list[int]] = None,
+    low_dpi: int = 100,
+    high_dpi: int = 300,
+    min_confidence: float = 0.9,
+    tile: bool = False,
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+    renderer: str = POPPLER,
+) -> list[OCR]:
+    """read pdf pages rendered at low dpi first,
+    then render and read again at high dpi only the pages recognized with low confidence.
+    large type is read well enough at low dpi, which saves upload bytes,
+    while fine print is read again at the resolution it needs.
+
+    Args:
+        f: File object of a pdf file.
+
+        pages: 0-based indices of the pages to read. the default reads all.
+
+        low_dpi, high_dpi: resolutions of the first and the second rendering.
+
+        min_confidence: pages whose mean confidence of symbols is under this are read again.
+        blank pages are not read again.
+
+        tile, crop, hedge: passed to OCR.
+
+        renderer: renderer of pdf pages. see Convertor.
+
+    Return:
+        OCR objects that have read each page.
+    """
+    if not f.is_pdf_file():
+        raise ValueError(f"Adaptive dpi is only for pdf file. Got {f.ext}.")
+    indices: list[int] = list(range(f.n_pages(f.paths[0]))) if pages is None else pages
+    ocrs: list[OCR] = []
+    # render, encode and read one page at a time, so that a page at high dpi is the most held at once
+    c = Convertor(pages=indices, dpi=low_dpi, renderer=renderer)
+    c.read_file(f)
+    for content in c.iter_pdf_pages_byte():
+        ocr = OCR(tile=tile, crop=crop, hedge=hedge)
+        ocr.read_bytes(content)
+        ocrs.append(ocr)
+    retry: list[int] = [i for i, ocr in enumerate(ocrs) if ocr.get_symbols().get_confidence() < min_confidence]
+    print(f"{len(retry)} of {len(ocrs)} pages are read again at {high_dpi} dpi.")
+    if retry == []:
+        return ocrs
+    c = Convertor(pages=[indices[i] for i in retry], dpi=high_dpi, renderer=renderer)
+    c.read_file(f)
+    for i, content in zip(retry, c.iter_pdf_pages_byte()):
+        ocrs[i] = OCR(tile=tile, crop=crop, hedge=hedge)
+        ocrs[i].read_bytes(content)
+    return ocrs
+
+
 def ocr_by_cloud_vision_api(
     file_or_dir: Path | str,
     ext: str = "png",
     dir_out: Optional[Path] = None,
     name_out: Optional[str] = None,
+    save_response: bool = False,
+    pages: Optional[str] = None,
+    tile: bool = False,
+    engine: str = "vision",
+    lang: str = "eng",
+    adaptive_dpi: bool = False,
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+    renderer: str = POPPLER,
 ) -> None:
     """ocr by google cloud vision api.
 
@@ -94,14 +344,61 @@ def ocr_by_cloud_vision_api(
         and the name of the first file (like 005.png -> 005.txt)
         in the directory if image files are provided.
         Note that the latter case could overwrite an output text file.
+
+        save_response: whether to save the symbols recognized in each page
+        in a npz file next to the output text file. relayout_responses reads them.
+
+        pages: selection of the pages to ocr in a zip or pdf file, like '1-5,8', '-10' or '/5'.
+        see Pages.parse_pages for the format. the default reads all the pages.
+
+        tile: whether to split images too large for the api into overlapping tiles
+        and read them concurrently, instead of rejecting them.
+
+        engine: 'vision', 'local' (tesseract) or 'auto' (local for Latin-only pages). see read_imgs.
+
+        lang: language of tesseract, used for pages read locally.
+
+        adaptive_dpi: whether to read a pdf file at low dpi first
+        and read again at high dpi only the pages with low confidence. see read_pdf_adaptively.
+        only for a pdf file with vision engine.
+
+        crop: whether to crop pages to their text region before uploading them. see Text_Region.
+
+        hedge: if provided, requests to the api slower than its latency percentile are sent again. see Hedge.
+
+        renderer: 'poppler' renders pdf pages by pdftoppm subprocess, and 'pdfium' in process. see Convertor.
     """
-    f, f_read = get_file_obj(file_or_dir, ext)
-    ocr_text: str = get_text_from_imgs(f_read.paths)
+    f, _ = get_file_obj(file_or_dir, ext, expand=False)
+    if adaptive_dpi:
+        if engine != "vision":
+            raise ValueError(f"Adaptive dpi needs confidence given by vision engine. Got {engine}.")
+        ocrs: list[OCR] = read_pdf_adaptively(
+            f, get_page_indices(f, pages), tile=tile, crop=crop, hedge=hedge, renderer=renderer
+        )
+    elif f.is_pdf_file():
+        # pdf pages are read in memory, without saving them as img files
+        ocrs = read_pdf(
+            f,
+            get_page_indices(f, pages),
+            tile=tile,
+            engine=engine,
+            lang=lang,
+            crop=crop,
+            hedge=hedge,
+            renderer=renderer,
+        )
+    else:
+        f, f_read = get_file_obj(file_or_dir, ext, pages=pages, renderer=renderer)
+        ocrs = read_imgs(f_read.paths, tile=tile, engine=engine, lang=lang, crop=crop, hedge=hedge)
+    symbols: Optional[list[Symbols]] = [] if save_response else None
+    ocr_text: str = get_text_from_ocrs(ocrs, symbols_out=symbols)
     # save text
     text_path, success = save_text(text=ocr_text, file=f, dir_out=dir_out, name_out=name_out)
     if not success:
         msg = f"Error occurred while trying to save ocr text {text_path}"
         raise Exception(msg)
+    if symbols is not None:
+        save_symbols(symbols, text_path, page_numbers=get_page_indices(f, pages))
 
 
 def save_text(
@@ -118,9 +415,117 @@ def save_text(
     return text_path, text_path.exists()
 
 
-def ocr_zips_at_once(dir: Path | str, dir_out: Optional[Path] = None):
+def ocr_zips_at_once(
+    dir: Path | str,
+    dir_out: Optional[Path] = None,
+    save_response: bool = False,
+    pages: Optional[str] = None,
+    tile: bool = False,
+    engine: str = "vision",
+    lang: str = "eng",
+    crop: bool = False,
+    hedge: Optional[Hedge] = None,
+):
     dir = Path(dir)
     if not dir.is_dir():
         raise ValueError(f"{dir} is not a directory.")
-    for file in dir.glob("*.zip"):
-        ocr_by_cloud_vision_api(file, dir_out=dir_out)
+    files: Paths = list(dir.glob("*.zip"))
+    if pages is not None:
+        # check the selection in every zip before any request, so that a batch does not stop halfway
+        files = [file for file in files if _has_pages(file, pages)]
+    for file in files:
+        ocr_by_cloud_vision_api(
+            file,
+            dir_out=dir_out,
+            save_response=save_response,
+            pages=pages,
+            tile=tile,
+            engine=engine,
+            lang=lang,
+            crop=crop,
+            hedge=hedge,
+        )
+
+
+def _has_pages(path: Path, pages: str) -> bool:
+    """whether pages selects any page of a zip file. the reason is printed if not."""
+    f: File = File()
+    f.read_file(path)
+    try:
+        get_page_indices(f, pages)
+    except ValueError as e:
+        print(f"skip {path.name}: {e}")
+        return False
+    return True
+
+
+def get_text_from_symbols(pages: list[Symbols], vertical_scale: float, iqr_scale: float, height_scale: float) -> str:
+    """concatenate all the text laid out from saved symbols. no api call is made."""
+    texts: list[str] = []
+    for symbols in pages:
+        ocr = OCR(vertical_scale=vertical_scale, iqr_scale=iqr_scale, height_scale=height_scale)
+        ocr.read_symbols(symbols)
+        texts.append("\n".join(ocr.get_line_texts()))
+    return "\n".join(texts)
+
+
+def _relayout_pages(pages: list[Symbols], params: list[tuple[float, float, float]]) -> list[str]:
+    """text of the pages laid out under each parameter set. run in worker processes."""
+    return [get_text_from_symbols(pages, vertical_scale=v, iqr_scale=i, height_scale=h) for v, i, h in params]
+
+
+def relayout_responses(
+    file_or_dir: Path | str,
+    dir_out: Optional[Path] = None,
+    vertical_scales: list[float] = [0.7],
+    iqr_scales: list[float] = [1.5],
+    height_scales: list[float] = [0.8],
+    workers: Optional[int] = None,
+    chunk_size: int = 64,
+) -> Paths:
+    """lay out text again from the npz files saved by ocr with save_response, without any api call.
+
+    Args:
+        file_or_dir: A path of a npz file or a directory containing them.
+
+        dir_out: destination directory of the output text files.
+        The default uses that of each npz file.
+
+        vertical_scales, iqr_scales, height_scales: values of each layout parameter.
+        every combination of them is tried. the parameters are appended to the name of the output files
+        like 'name_v0.7_i1.5_h0.8.txt', even if there is a single combination.
+
+        workers: the number of worker processes. the default uses the number of cpus.
+
+        chunk_size: the number of pages laid out at once by a worker.
+        the pages of every file are split into chunks so that even a single file is laid out on all the cpus.
+
+    Return:
+        paths of the saved text files.
+    """
+    path = Path(file_or_dir)
+    if not path.exists():
+        raise ValueError(f"Invalid argument. Not exists: {file_or_dir}")
+    npz_paths: Paths = [path] if path.is_file() else sorted(path.glob("*.npz"))
+    params: list[tuple[float, float, float]] = list(itertools.product(vertical_scales, iqr_scales, height_scales))
+    text_paths: Paths = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures: list[list[Future[list[str]]]] = []
+        for npz_path in npz_paths:
+            pages, _ = load_symbols(npz_path)
+            futures.append(
+                [
+                    executor.submit(_relayout_pages, pages[start : start + chunk_size], params)
+                    for start in range(0, len(pages), chunk_size)
+                ]
+            )
+        for npz_path, chunk_futures in zip(npz_paths, futures):
+            chunks: list[list[str]] = [f.result() for f in chunk_futures]
+            save_dir: Path = npz_path.parent if dir_out is None else dir_out
+            for k, (v, i, h) in enumerate(params):
+                # always suffixed so that the text saved by ocr next to the npz file is never overwritten
+                text_path: Path = save_dir / f"{npz_path.stem}_v{v}_i{i}_h{h}.txt"
+                with open(text_path, mode="w") as tf:
+                    tf.write("\n".join(chunk[k] for chunk in chunks))
+                text_paths.append(text_path)
+    return text_paths
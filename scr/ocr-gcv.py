@@ -2,7 +2,9 @@ from typing import Optional
 
 import click
 
-from main import ocr_by_cloud_vision_api, ocr_zips_at_once, preview_files
+from Hedge import Hedge
+from Job_Queue import Job_Queue, work_in_processes
+from main import ocr_by_cloud_vision_api, ocr_zips_at_once, preview_files, relayout_responses
 from Type_Alias import Path
 
 # this file is for turning main.py into command line tool by click package.
@@ -19,8 +21,36 @@ def cli():
 @click.option(
     "-e", "--ext", type=str, default="png", help="file extension without period mark'.'. the default uses 'png'."
 )
-def preview(path: str, ext: str):
-    preview_files(path, ext)
+@click.option(
+    "-P",
+    "--plan",
+    type=bool,
+    is_flag=True,
+    help="whether to print the number of api requests and the upload size of each document and in total, without rendering or extracting anything. a directory gives its images of the ext as ocr reads it.",
+)
+@click.option(
+    "-p",
+    "--pages",
+    type=str,
+    default=None,
+    help="pages to read in each zip or pdf file, like '1-5,8'. see ocr command. used only with --plan.",
+)
+@click.option(
+    "-t",
+    "--tile",
+    type=bool,
+    is_flag=True,
+    help="whether images over the api limits are split into tiles. see ocr command. used only with --plan.",
+)
+@click.option(
+    "-z",
+    "--zips",
+    type=bool,
+    is_flag=True,
+    help="whether a directory gives each zip file in it instead, as zocr reads it. used only with --plan.",
+)
+def preview(path: str, ext: str, plan: bool, pages: Optional[str], tile: bool, zips: bool):
+    preview_files(path, ext, plan=plan, pages=pages, tile=tile, zips=zips)
 
 
 @cli.command(help="ocr file(s in a directory) and save the result in a text file. The first argument must be a path.")
@@ -50,11 +80,99 @@ def preview(path: str, ext: str):
     is_flag=True,
     help="whether to name output text file after its parent directory. Used only when directory path is provided and name option is not explicitly provided.",
 )
-def ocr(path: str, ext: str, lang: str, dir_out: str | None, name: str | None, auto: bool):
+@click.option(
+    "-s",
+    "--save-response",
+    "save_response",
+    type=bool,
+    is_flag=True,
+    help="whether to save the recognized symbols in a npz file next to the output text file. use relayout command to lay them out again.",
+)
+@click.option(
+    "-p",
+    "--pages",
+    type=str,
+    default=None,
+    help="pages to read in a zip or pdf file, given by comma separated 1-based numbers or ranges. e.g. '1-5,8', '-10' (the first 10 pages), '10-', '1-100/10' or '/5' (every 5th page). the default reads all the pages.",
+)
+@click.option(
+    "-t",
+    "--tile",
+    type=bool,
+    is_flag=True,
+    help="whether to split images over the api limits (20 MB or 75 megapixels) into overlapping tiles and read them concurrently, instead of rejecting them.",
+)
+@click.option(
+    "-g",
+    "--engine",
+    type=click.Choice(["vision", "local", "auto"]),
+    default="vision",
+    help="ocr engine. 'vision' uses google cloud vision api, 'local' uses local tesseract, and 'auto' reads pages in Latin script by local tesseract in parallel and the other pages by the api. the default uses 'vision'.",
+)
+@click.option(
+    "--adaptive-dpi",
+    "adaptive_dpi",
+    type=bool,
+    is_flag=True,
+    help="whether to read a pdf file at 100 dpi first and read again at 300 dpi only the pages recognized with low confidence. only for a pdf file with vision engine.",
+)
+@click.option(
+    "-c",
+    "--crop",
+    type=bool,
+    is_flag=True,
+    help="whether to crop pages to their text region before uploading them, which removes margins and gutter shadows of scans.",
+)
+@click.option(
+    "--hedge",
+    type=bool,
+    is_flag=True,
+    help="whether to send again a request slower than the 95th percentile of the latencies so far and take whichever answers first. duplicates are capped at 5% of the requests.",
+)
+@click.option(
+    "-r",
+    "--renderer",
+    type=click.Choice(["poppler", "pdfium"]),
+    default="poppler",
+    help="renderer of pdf pages. 'poppler' runs pdftoppm in a subprocess, and 'pdfium' renders in process by pypdfium2. the default uses 'poppler'.",
+)
+def ocr(
+    path: str,
+    ext: str,
+    lang: str,
+    dir_out: str | None,
+    name: str | None,
+    auto: bool,
+    save_response: bool,
+    pages: str | None,
+    tile: bool,
+    engine: str,
+    adaptive_dpi: bool,
+    crop: bool,
+    hedge: bool,
+    renderer: str,
+):
     dir_out_new: Path | None = Path(dir_out) if dir_out is not None else None
     path_in = Path(path)
     name_new: str | None = path_in.stem if auto and name is None and path_in.is_dir() else name
-    ocr_by_cloud_vision_api(file_or_dir=path, ext=ext, dir_out=dir_out_new, name_out=name_new)
+    hedger: Hedge | None = Hedge() if hedge else None
+    ocr_by_cloud_vision_api(
+        file_or_dir=path,
+        ext=ext,
+        dir_out=dir_out_new,
+        name_out=name_new,
+        save_response=save_response,
+        pages=pages,
+        tile=tile,
+        engine=engine,
+        lang=lang,
+        adaptive_dpi=adaptive_dpi,
+        crop=crop,
+        hedge=hedger,
+        renderer=renderer,
+    )
+    if hedger is not None:
+        hedger.print_stats()
 
 
 @cli.command(
@@ -69,9 +187,216 @@ def ocr(path: str, ext: str, lang: str, dir_out: str | None, name: str | None, a
     default=None,
     help="path of the output directory. the default uses the same directory input as the argument.",
 )
-def zocr(dir: str, dir_out: Optional[str]):
+@click.option(
+    "-s",
+    "--save-response",
+    "save_response",
+    type=bool,
+    is_flag=True,
+    help="whether to save the recognized symbols in a npz file next to each output text file.",
+)
+@click.option(
+    "-p",
+    "--pages",
+    type=str,
+    default=None,
+    help="pages to read in each zip file, given by comma separated 1-based numbers or ranges. e.g. '1-5,8', '-10' (the first 10 pages), '10-', '1-100/10' or '/5' (every 5th page). the default reads all the pages.",
+)
+@click.option(
+    "-t",
+    "--tile",
+    type=bool,
+    is_flag=True,
+    help="whether to split images over the api limits (20 MB or 75 megapixels) into overlapping tiles and read them concurrently, instead of rejecting them.",
+)
+@click.option(
+    "-g",
+    "--engine",
+    type=click.Choice(["vision", "local", "auto"]),
+    default="vision",
+    help="ocr engine. 'vision' uses google cloud vision api, 'local' uses local tesseract, and 'auto' reads pages in Latin script by local tesseract in parallel and the other pages by the api. the default uses 'vision'.",
+)
+@click.option(
+    "-l", "--lang", type=str, default="eng", help="language of local tesseract. the default uses 'eng'=English."
+)
+@click.option(
+    "-c",
+    "--crop",
+    type=bool,
+    is_flag=True,
+    help="whether to crop pages to their text region before uploading them, which removes margins and gutter shadows of scans.",
+)
+@click.option(
+    "--hedge",
+    type=bool,
+    is_flag=True,
+    help="whether to send again a request slower than the 95th percentile of the latencies so far and take whichever answers first. duplicates are capped at 5% of the requests.",
+)
+def zocr(
+    dir: str,
+    dir_out: Optional[str],
+    save_response: bool,
+    pages: Optional[str],
+    tile: bool,
+    engine: str,
+    lang: str,
+    crop: bool,
+    hedge: bool,
+):
+    dirout: Optional[Path] = Path(dir_out) if isinstance(dir_out, str) else None
+    hedger: Optional[Hedge] = Hedge() if hedge else None
+    ocr_zips_at_once(
+        dir=dir,
+        dir_out=dirout,
+        save_response=save_response,
+        pages=pages,
+        tile=tile,
+        engine=engine,
+        lang=lang,
+        crop=crop,
+        hedge=hedger,
+    )
+    if hedger is not None:
+        hedger.print_stats()
+
+
+@cli.command(
+    help="lay out text again from npz file(s) saved by ocr with --save-response. no api call is made. output files are named like name_v0.7_i1.5_h0.8.txt. The first argument must be a path of a npz file or a directory."
+)
+@click.argument("path", nargs=1, type=click.Path(exists=True))
+@click.option(
+    "-d",
+    "--dirout",
+    "dir_out",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="path of the output directory. the default uses the same directory as each npz file.",
+)
+@click.option(
+    "-v",
+    "--vscale",
+    "vertical_scales",
+    type=float,
+    multiple=True,
+    default=[0.7],
+    help="scale for grouping symbols into lines. repeat to sweep, e.g., -v 0.6 -v 0.7. the default uses 0.7.",
+)
+@click.option(
+    "-i",
+    "--iqrscale",
+    "iqr_scales",
+    type=float,
+    multiple=True,
+    default=[1.5],
+    help="iqr scale for inserting spaces. repeat to sweep. the default uses 1.5.",
+)
+@click.option(
+    "-h",
+    "--hscale",
+    "height_scales",
+    type=float,
+    multiple=True,
+    default=[0.8],
+    help="line height scale for inserting spaces. repeat to sweep. the default uses 0.8.",
+)
+@click.option(
+    "-w", "--workers", type=int, default=None, help="the number of worker processes. the default uses all cpus."
+)
+def relayout(
+    path: str,
+    dir_out: Optional[str],
+    vertical_scales: tuple[float, ...],
+    iqr_scales: tuple[float, ...],
+    height_scales: tuple[float, ...],
+    workers: Optional[int],
+):
+    dirout: Optional[Path] = Path(dir_out) if isinstance(dir_out, str) else None
+    relayout_responses(
+        file_or_dir=path,
+        dir_out=dirout,
+        vertical_scales=list(vertical_scales),
+        iqr_scales=list(iqr_scales),
+        height_scales=list(height_scales),
+        workers=workers,
+    )
+
+
+db_option = click.option(
+    "-q",
+    "--queue",
+    "db",
+    type=click.Path(dir_okay=False),
+    default="ocr_queue.sqlite",
+    help="path of the sqlite file of the work queue. the default uses 'ocr_queue.sqlite' in the current directory.",
+)
+
+
+@cli.command(
+    help="add pages of file(s) to the work queue without reading them. run work command to ocr them. The arguments must be paths."
+)
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@db_option
+@click.option(
+    "-e", "--ext", type=str, default="png", help="file extension without period mark'.'. the default uses 'png'"
+)
+@click.option(
+    "-d",
+    "--dirout",
+    "dir_out",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="path of the output directory. the default uses the same directory input as the argument.",
+)
+@click.option(
+    "-p",
+    "--pages",
+    type=str,
+    default=None,
+    help="pages to read in each zip or pdf file. see ocr command for the format. the default reads all the pages.",
+)
+def enqueue(paths: tuple[str, ...], db: str, ext: str, dir_out: Optional[str], pages: Optional[str]):
     dirout: Optional[Path] = Path(dir_out) if isinstance(dir_out, str) else None
-    ocr_zips_at_once(dir=dir, dir_out=dirout)
+    queue = Job_Queue(db)
+    try:
+        for path in paths:
+            n_pages: int = queue.enqueue(path, ext=ext, dir_out=dirout, pages=pages)
+            print(f"{path}: {n_pages} pages")
+    finally:
+        queue.close()
+
+
+@cli.command(
+    help="ocr pages in the work queue until all of them are done. text of each file is saved when its last page is done. run this on as many processes or hosts as you like."
+)
+@db_option
+@click.option("-w", "--workers", type=int, default=1, help="the number of worker processes. the default uses 1.")
+@click.option(
+    "-l",
+    "--lease",
+    type=float,
+    default=300,
+    help="seconds after which a page claimed by a worker can be claimed by another worker. the default uses 300.",
+)
+@click.option(
+    "-r",
+    "--renderer",
+    type=click.Choice(["poppler", "pdfium"]),
+    default="poppler",
+    help="renderer of pdf pages. 'poppler' runs pdftoppm in a subprocess, and 'pdfium' renders in process by pypdfium2. the default uses 'poppler'.",
+)
+def work(db: str, workers: int, lease: float, renderer: str):
+    work_in_processes(db, workers=workers, lease=lease, renderer=renderer)
+
+
+@cli.command(help="show the number of pages in each state in the work queue.")
+@db_option
+def status(db: str):
+    queue = Job_Queue(db)
+    try:
+        print(queue.get_status())
+        queue.print_failed_pages()
+    finally:
+        queue.close()
 
 
 if __name__ == "__main__":
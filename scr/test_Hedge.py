@@ -0,0 +1,72 @@
+import threading
+import time
+
+from google.cloud.vision_v1.types.image_annotator import AnnotateImageResponse as Response
+
+from Hedge import Hedge
+from OCR_by_google import OCR
+
+
+class Stub_OCR(OCR):
+    """answers without the api. the first request of a content in slow_once takes long, and its duplicate does not."""
+
+    lock = threading.Lock()
+    latency: float = 0.001
+    slow_once: set[bytes] = set()
+    sent: list[bytes] = []
+
+    def _annotate(self, content: bytes) -> Response:
+        with self.lock:
+            self.sent.append(content)
+            slow: bool = content in self.slow_once
+            self.slow_once.discard(content)
+        time.sleep(0.2 if slow else self.latency)
+        return Response()
+
+
+def read(hedge: Hedge, content: bytes) -> None:
+    ocr = Stub_OCR(hedge=hedge)
+    ocr.read_bytes(content)
+
+
+def setup_function():
+    Stub_OCR.latency = 0.001
+    Stub_OCR.slow_once = set()
+    Stub_OCR.sent = []
+
+
+def test_no_hedge_before_min_samples():
+    hedge = Hedge(max_extra=1.0, min_samples=5)
+    # the last one would be hedged after the latencies of the first 4
+    Stub_OCR.slow_once = {b"4"}
+    for i in range(5):
+        read(hedge, str(i).encode())
+    assert hedge.get_stats() == (5, 0, 0)
+    assert len(Stub_OCR.sent) == 5
+
+
+def test_duplicate_of_slow_request_wins():
+    hedge = Hedge(max_extra=1.0, min_samples=5)
+    for i in range(5):
+        read(hedge, str(i).encode())
+    Stub_OCR.slow_once = {b"slow"}
+    start: float = time.perf_counter()
+    read(hedge, b"slow")
+    # the duplicate answered long before the first request
+    assert time.perf_counter() - start < 0.1
+    assert hedge.get_stats() == (6, 1, 1)
+    assert Stub_OCR.sent.count(b"slow") == 2
+
+
+def test_duplicates_are_capped_by_budget():
+    hedge = Hedge(max_extra=0.01, min_samples=5)
+    for i in range(200):
+        read(hedge, str(i).encode())
+    # the next 10 requests are slower than the percentile, which a budget of 2 duplicates caps
+    Stub_OCR.latency = 0.02
+    for i in range(10):
+        read(hedge, str(i).encode())
+    stats = hedge.get_stats()
+    assert stats.requests == 210
+    assert stats.hedged == 2
+    assert len(Stub_OCR.sent) == stats.requests + stats.hedged
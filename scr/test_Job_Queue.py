@@ -0,0 +1,63 @@
+import sqlite3
+import time
+
+import cv2
+import numpy as np
+
+from Job_Queue import Job_Queue
+from Type_Alias import Path
+
+
+def make_imgs(dir: Path, n: int) -> None:
+    for i in range(n):
+        cv2.imwrite(str(dir / f"{i:03}.png"), np.full((20, 20), 255, dtype=np.uint8))
+
+
+def test_expired_lease_is_claimed_by_another_worker(tmp_path: Path):
+    make_imgs(tmp_path, 1)
+    db: Path = tmp_path / "queue.sqlite"
+    crashed = Job_Queue(db, lease=0.05, worker="crashed")
+    assert crashed.enqueue(tmp_path / "000.png") == 1
+    page_id, _, _ = crashed.claim()
+    other = Job_Queue(db, lease=60, worker="other")
+    # the page is leased to the first worker
+    assert other.claim() is None
+    time.sleep(0.1)
+    claimed = other.claim()
+    assert claimed is not None and claimed[0] == page_id
+    # the first worker has lost the page
+    assert crashed.complete(page_id, "late") is None
+    text_path = other.complete(page_id, "text")
+    assert text_path is not None and text_path.read_text() == "text"
+    assert other.get_status()["done"] == 1
+
+
+def test_stale_assembling_is_recovered(tmp_path: Path):
+    make_imgs(tmp_path, 1)
+    db: Path = tmp_path / "queue.sqlite"
+    queue = Job_Queue(db, lease=60, worker="a")
+    queue.enqueue(tmp_path / "000.png")
+    page_id, _, _ = queue.claim()
+    # the worker crashed while assembling the document
+    con = sqlite3.connect(str(db), isolation_level=None)
+    con.execute("UPDATE pages SET state = 'done', text = 'text' WHERE id = ?", (page_id,))
+    con.execute("UPDATE docs SET state = 'assembling', lease_until = ?", (time.time() + 60,))
+    assert queue.assemble_ready() == []
+    con.execute("UPDATE docs SET lease_until = 0")
+    con.close()
+    (text_path,) = queue.assemble_ready()
+    assert text_path.read_text() == "text"
+
+
+def test_failed_page_is_marked_in_text(tmp_path: Path):
+    make_imgs(tmp_path, 2)
+    db: Path = tmp_path / "queue.sqlite"
+    queue = Job_Queue(db, lease=60, max_attempts=1, worker="a")
+    queue.enqueue(tmp_path, ext="png")
+    first, _, _ = queue.claim()
+    second, _, _ = queue.claim()
+    assert queue.complete(first, "text") is None
+    queue.fail(second, "error")
+    assert queue.is_finished()
+    assert (tmp_path / "000.txt").read_text() == "text\n[ocr failed: page 2]"
+    assert queue.get_failed_pages() == [(tmp_path.resolve(), 2, "error")]